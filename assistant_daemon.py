@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Assistant Daemon - Long-running owner of the email pipeline
+
+Keeps the pipeline, backend connection and caches alive between UI
+sessions. Emails are checked in the background and anything that needs a
+decision is held as a pending approval. The CLI (or any other UI) talks to
+it over a local Unix socket with newline-delimited JSON-RPC 2.0.
+
+Run:    python3 email_assistant_cli.py --daemon
+Methods: status, pending, decide(item_id, choice), stats, check, search(query, limit)
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+from body_normalizer import fresh_body
+from mail_priority import VIP, aged_key
+from rate_limiter import get_limiter
+
+
+SOCKET_PATH = Path.home() / '.email_assistant' / 'daemon.sock'
+
+
+class RPCError(Exception):
+    """Error returned to an RPC client"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class AssistantDaemon:
+    """Runs the pipeline in the background and serves it over a Unix socket"""
+
+    def __init__(self, assistant, socket_path=None):
+        self.assistant = assistant
+        self.socket_path = Path(socket_path) if socket_path else SOCKET_PATH
+        self.lock = threading.RLock()
+        self.pending = OrderedDict()
+        self.started = time.time()
+        self.last_check = None
+        self.stop_event = threading.Event()
+        self.server = None
+
+    # Pipeline
+
+    def check(self):
+        """Fetch new mail and queue whatever needs a decision"""
+        with self.lock:
+            self.assistant.reload_config()
+            if not self.assistant.backend_ready():
+                return 0
+            fetched_at = time.time()
+            emails = self.assistant.fetch_new_emails()
+            self.assistant.stats['checked'] += len(emails)
+            self.last_check = datetime.now().isoformat()
+
+            queued = 0
+            # Boss and VIP mail is classified (and its skills run) first
+            threads = self.assistant.collect_threads(emails)
+            for root, email_data, level in self.assistant.prioritize(threads, fetched_at):
+                item = self.classify(root, email_data)
+                if item and self.enqueue(root, item, level, fetched_at):
+                    queued += 1
+            # Every email is now decided or held in threads.db
+            self.commit()
+            return queued
+
+    def commit(self):
+        """Let the backend move its sync position past the checked mail"""
+        self.assistant.connector.commit()
+
+    def restore(self):
+        """Queue again the items that were waiting for a decision when we last stopped"""
+        with self.lock:
+            for root, email_data, state in self.assistant.thread_index.held():
+                item = self.classify(root, email_data)
+                if item is None:
+                    continue
+                if state.get('folder'):
+                    item['folder'] = state['folder']
+                item.update(level=state['level'], queued_at=state['queued_at'], seen=False)
+                self.pending[root] = item
+
+    def classify(self, root, email_data):
+        """Build the pending item for a thread's latest email (None if nothing to decide)"""
+        sender = email_data.get('from', '')
+        if sender in self.assistant.config.get('blocked_senders', []):
+            self.assistant.thread_index.resolve(root)
+            return None
+
+        item = {'email': email_data, 'work': None}
+        if self.assistant.is_spam_email(email_data):
+            item['kind'] = 'spam'
+            self.assistant.search_index.add(email_data, fresh_body(email_data), 'spam')
+        else:
+            item['work'] = self.assistant.prepare_work(email_data)
+            item['kind'] = 'task' if item['work'] else 'info'
+        return item
+
+    def enqueue(self, root, item, level, queued_at):
+        """Hold a classified item for a decision, or act on it now; True if held"""
+        email_data = item['email']
+        if (item['kind'] == 'spam' and self.assistant.config['auto_unsubscribe']
+                and email_data.get('list_unsubscribe')):
+            self.assistant.auto_unsubscribe(email_data)
+            self.assistant.thread_index.resolve(root)
+            return False
+        # A newer message replaces its thread's pending item but keeps its
+        # place in the aging order
+        previous = self.pending.pop(root, None)
+        item['level'] = level
+        item['queued_at'] = previous['queued_at'] if previous else queued_at
+        item['seen'] = False
+        self.pending[root] = item
+        self.assistant.thread_index.hold(root, email_data, level=level, queued_at=item['queued_at'],
+                                         folder=item.get('folder'))
+        return True
+
+    def summary(self, root, item):
+        """JSON-safe view of a pending item"""
+        email_data = item['email']
+        summary = {
+            'id': root,
+            'kind': item['kind'],
+            'from': email_data.get('from', ''),
+            'subject': email_data.get('subject', ''),
+            'preview': fresh_body(email_data)[:150],
+            'thread_count': email_data.get('thread_count', 1),
+            'priority': item['level'],
+            'choices': {'spam': 'ubni', 'task': 'aedr', 'info': 'rs'}[item['kind']]
+        }
+        if item['work']:
+            summary['task_type'] = item['work']['task']['type']
+            summary['request'] = item['work']['task']['extracted_request']
+            summary['output'] = item['work']['result']['output']
+        return summary
+
+    # RPC methods
+
+    def rpc_status(self):
+        return {
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started),
+            'last_check': self.last_check,
+            'pending': len(self.pending),
+            'mail_app': self.assistant.config.get('mail_app', 'outlook')
+        }
+
+    def rpc_pending(self):
+        """Pending items, most urgent first"""
+        aging = self.assistant.config['priority_aging_seconds']
+        with self.lock:
+            ordered = sorted(self.pending.items(),
+                             key=lambda entry: aged_key(entry[1]['level'], entry[1]['queued_at'], aging))
+            now = time.time()
+            for _, item in ordered:
+                if not item['seen']:
+                    item['seen'] = True
+                    if item['level'] == VIP:
+                        self.assistant.vip_first_looks.append(now - item['queued_at'])
+            return [self.summary(root, item) for root, item in ordered]
+
+    def rpc_decide(self, item_id, choice):
+        with self.lock:
+            item = self.pending.get(item_id)
+            if item is None:
+                raise RPCError(-32602, f"No pending item {item_id}")
+            choice = (choice or '').strip().lower()[:1]
+
+            email_data = item['email']
+            if item['kind'] == 'spam':
+                self.assistant.apply_spam_decision(email_data, choice)
+            elif item['kind'] == 'task':
+                self.assistant.apply_work_decision(email_data, item['work'], choice)
+            else:
+                self.assistant.apply_info_decision(email_data, choice)
+
+            if not email_data.get('deferred'):
+                del self.pending[item_id]
+                self.assistant.thread_index.resolve(item_id)
+            return {'id': item_id, 'deferred': bool(email_data.get('deferred'))}
+
+    def rpc_stats(self):
+        cache = self.assistant.result_cache
+        return {
+            **self.assistant.stats,
+            'result_cache': {**cache.stats, 'hit_rate': round(cache.hit_rate(), 3)},
+            'rate_limiter': get_limiter(self.assistant.config).metrics,
+            'transfer': getattr(self.assistant.connector.backend, 'transfer', None),
+            'header_stage': self.assistant.connector.stats,
+            'vip_first_look': self.assistant.first_look_summary()
+        }
+
+    def rpc_check(self):
+        queued = self.check()
+        self.assistant.scheduler.record(queued)
+        return {'queued': queued, 'pending': len(self.pending)}
+
+    def rpc_search(self, query, limit=10):
+        return self.assistant.search_index.search(query, limit)
+
+    def dispatch(self, request):
+        """Handle one JSON-RPC request dict; returns the response dict"""
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        method = getattr(self, f"rpc_{request.get('method', '')}", None)
+        try:
+            if method is None:
+                raise RPCError(-32601, f"Unknown method {request.get('method')}")
+            params = request.get('params') or {}
+            response['result'] = method(*params) if isinstance(params, list) else method(**params)
+        except RPCError as e:
+            response['error'] = {'code': e.code, 'message': str(e)}
+        except TypeError as e:
+            response['error'] = {'code': -32602, 'message': str(e)}
+        except Exception as e:
+            response['error'] = {'code': -32000, 'message': str(e)}
+        return response
+
+    # Serving
+
+    def poll_loop(self):
+        """Check mail on the adaptive schedule until stopped"""
+        scheduler = self.assistant.scheduler
+        while not self.stop_event.is_set():
+            try:
+                scheduler.record(self.check())
+            except Exception as e:
+                self.assistant.log(f"Error in poll loop: {e}")
+            if not scheduler.wait():
+                break
+
+    def serve_forever(self):
+        """Serve RPC requests and poll mail until stop()"""
+        if is_daemon_running(self.socket_path):
+            raise RuntimeError(f"Daemon already running on {self.socket_path}")
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            # Left behind by a daemon that didn't shut down cleanly
+            self.socket_path.unlink()
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        response = daemon.dispatch(json.loads(line))
+                    except ValueError:
+                        response = {'jsonrpc': '2.0', 'id': None,
+                                    'error': {'code': -32700, 'message': 'Parse error'}}
+                    self.wfile.write(json.dumps(response, default=str).encode() + b'\n')
+
+        self.server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), Handler)
+        self.server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+
+        self.restore()
+        threading.Thread(target=self.poll_loop, daemon=True).start()
+        self.assistant.config_watcher.start()
+        self.assistant.log(f"Daemon listening on {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+
+    def stop(self):
+        """Stop polling and serving"""
+        self.stop_event.set()
+        self.assistant.config_watcher.stop()
+        self.assistant.scheduler.stop()
+        self.assistant.reputation.save()
+        if self.server:
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class DaemonClient:
+    """Minimal JSON-RPC client for the daemon socket"""
+
+    def __init__(self, socket_path=None, timeout=120):
+        self.socket_path = Path(socket_path) if socket_path else SOCKET_PATH
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(str(self.socket_path))
+        self.reader = self.sock.makefile('rb')
+        self.next_id = 0
+
+    def call(self, method, **params):
+        """Call a daemon method and return its result"""
+        self.next_id += 1
+        request = {'jsonrpc': '2.0', 'id': self.next_id, 'method': method, 'params': params}
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Daemon closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RPCError(response['error']['code'], response['error']['message'])
+        return response['result']
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def is_daemon_running(socket_path=None):
+    """True if a daemon answers on the socket"""
+    try:
+        client = DaemonClient(socket_path, timeout=2)
+    except OSError:
+        return False
+    client.close()
+    return True
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Body Normalizer - Strips quoted replies and signatures from email bodies
+
+Long reply chains are mostly quoted history and legal footers. Everything
+that scores a message (spam check, task parsing, request extraction) should
+only look at the fresh text the sender actually wrote.
+"""
+
+import re
+
+
+# "On Mon, Jan 5, 2026 at 9:00 AM Jane <jane@x.com> wrote:"
+ON_WROTE = re.compile(r'^\s*on\s.{0,200}\bwrote:\s*$', re.IGNORECASE)
+ORIGINAL_MESSAGE = re.compile(r'^\s*-{2,}\s*(original message|forwarded message)\s*-{2,}', re.IGNORECASE)
+OUTLOOK_FROM = re.compile(r'^\s*\*?from:\*?\s', re.IGNORECASE)
+OUTLOOK_SENT = re.compile(r'^\s*\*?(sent|date):\*?\s', re.IGNORECASE)
+SIGNATURE = re.compile(
+    r'^\s*(--\s*$|__+\s*$|sent from my \w+|get outlook for \w+|'
+    r'confidentiality notice|this (e-?mail|message) (and any attachments )?(is|may contain|contains) confidential)',
+    re.IGNORECASE
+)
+OUTLOOK_HEADER_WINDOW = 3
+
+
+def strip_quoted(body):
+    """Split a body into fresh text and quoted/signature text.
+
+    Makes one pass over the lines. Inline '>' quotes are dropped and the
+    pass continues; a reply header ("On ... wrote:", Outlook "From:/Sent:",
+    "Original Message") or a signature marker ends the fresh text.
+
+    Returns (fresh_text, offsets) where offsets are the (start, end)
+    character ranges of the original body that were kept.
+    """
+    if not body:
+        return '', []
+
+    lines = body.splitlines(keepends=True)
+    offsets = []
+    pos = 0
+
+    for i, line in enumerate(lines):
+        start, pos = pos, pos + len(line)
+        text = line.rstrip('\r\n')
+
+        if text.lstrip().startswith('>'):
+            continue
+        if ON_WROTE.match(text) or ORIGINAL_MESSAGE.match(text) or SIGNATURE.match(text):
+            break
+        if OUTLOOK_FROM.match(text) and any(
+            OUTLOOK_SENT.match(following)
+            for following in lines[i + 1:i + 1 + OUTLOOK_HEADER_WINDOW]
+        ):
+            break
+
+        if offsets and offsets[-1][1] == start:
+            offsets[-1] = (offsets[-1][0], pos)
+        else:
+            offsets.append((start, pos))
+
+    fresh = ''.join(body[start:end] for start, end in offsets).strip()
+    return fresh, offsets
+
+
+def fresh_body(email_data):
+    """Get the fresh (unquoted) body, caching it on the message record"""
+    if 'fresh_body' not in email_data:
+        fresh, offsets = strip_quoted(email_data.get('body', ''))
+        email_data['fresh_body'] = fresh
+        email_data['fresh_offsets'] = offsets
+    return email_data['fresh_body']
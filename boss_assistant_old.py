@@ -11,11 +11,20 @@ from tkinter import ttk, messagebox, scrolledtext
 import threading
 import json
 import os
+import queue
 import re
-import time
 from datetime import datetime
 from pathlib import Path
 
+from poll_scheduler import PollScheduler
+
+
+# UI events are applied on the Tk main loop every UI_DRAIN_MS, at most
+# UI_BATCH at a time, so a burst of log lines costs one redraw per batch
+UI_DRAIN_MS = 50
+UI_BATCH = 500
+MAX_LOG_LINES = 2000
+
 
 class BossAssistant:
     """Main Boss Assistant class"""
@@ -23,6 +32,8 @@ class BossAssistant:
     def __init__(self):
         self.config = self.load_config()
         self.is_running = False
+        self.monitor_thread = None
+        self.scheduler = PollScheduler.from_config(self.config, 'check_interval_minutes', scale=60)
         self.learned_skills_dir = Path.home() / '.boss_assistant' / 'skills'
         self.learned_skills_dir.mkdir(parents=True, exist_ok=True)
         
@@ -30,7 +41,10 @@ class BossAssistant:
         self.root.title("Boss Assistant 🤖")
         self.root.geometry("900x700")
         
+        # Worker threads never touch Tk; they post here and the main loop drains it
+        self.ui_events = queue.SimpleQueue()
         self.setup_ui()
+        self.root.after(UI_DRAIN_MS, self.drain_ui_events)
         
     def load_config(self):
         """Load configuration"""
@@ -108,6 +122,17 @@ class BossAssistant:
         )
         self.stop_btn.pack(side=tk.LEFT, padx=5)
         
+        tk.Button(
+            btn_frame,
+            text="🔄 Check Now",
+            command=self.scheduler.wake,
+            bg='#6c757d',
+            fg='white',
+            font=('Segoe UI', 10),
+            padx=15,
+            pady=10
+        ).pack(side=tk.LEFT, padx=5)
+        
         tk.Button(
             btn_frame,
             text="📚 View Learned Skills",
@@ -147,10 +172,48 @@ class BossAssistant:
         self.log(f"Configured to monitor: {self.config['boss_email']}")
         self.log("Click 'Start Monitoring' to begin.")
     
+    def run(self):
+        """Run the Tk main loop"""
+        self.root.mainloop()
+    
     def log(self, message):
-        """Add log message"""
+        """Add log message (safe from any thread)"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.ui_events.put(f"[{timestamp}] {message}\n")
+    
+    def post(self, callback, *args):
+        """Run callback on the Tk main loop (safe from any thread)"""
+        self.ui_events.put((callback, args))
+    
+    def drain_ui_events(self):
+        """Apply queued UI events in one batch, then reschedule"""
+        lines = []
+        try:
+            for _ in range(UI_BATCH):
+                event = self.ui_events.get_nowait()
+                if isinstance(event, str):
+                    lines.append(event)
+                    continue
+                # Keep log lines and widget updates in the order they were posted
+                self.append_log(lines)
+                lines = []
+                callback, args = event
+                callback(*args)
+        except queue.Empty:
+            pass
+        finally:
+            self.append_log(lines)
+            self.root.after(UI_DRAIN_MS, self.drain_ui_events)
+    
+    def append_log(self, lines):
+        """One insert and one scroll for a batch of log lines, trimming old ones"""
+        if not lines:
+            return
+        self.log_text.insert(tk.END, ''.join(lines))
+        # The text always ends with a newline, so 'end' is one past the last line
+        excess = int(self.log_text.index(tk.END).split('.')[0]) - 2 - MAX_LOG_LINES
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
         self.log_text.see(tk.END)
     
     def start_monitoring(self):
@@ -161,7 +224,10 @@ class BossAssistant:
         self.status_var.set("🔍 Monitoring for boss emails...")
         self.log("Started monitoring for boss emails")
         
-        # Start monitoring thread
+        # A stopped loop may still be finishing a check; reset() would let it run on
+        if self.monitor_thread is not None:
+            self.monitor_thread.join()
+        self.scheduler.reset()
         self.monitor_thread = threading.Thread(target=self.monitor_loop)
         self.monitor_thread.daemon = True
         self.monitor_thread.start()
@@ -169,6 +235,7 @@ class BossAssistant:
     def stop_monitoring(self):
         """Stop email monitoring"""
         self.is_running = False
+        self.scheduler.stop()
         self.start_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.DISABLED)
         self.status_var.set("⏹️ Stopped")
@@ -178,28 +245,29 @@ class BossAssistant:
         """Main monitoring loop"""
         while self.is_running:
             try:
-                self.check_emails()
-                # Sleep for check interval
-                for _ in range(self.config['check_interval_minutes'] * 60):
-                    if not self.is_running:
-                        break
-                    time.sleep(1)
+                self.scheduler.record(self.check_emails())
             except Exception as e:
                 self.log(f"Error in monitor loop: {e}")
-                time.sleep(60)  # Wait 1 minute on error
+                self.scheduler.throttle(60)  # Wait at least 1 minute on error
+            # Sleeps until the next check; Stop and Check Now wake it early
+            if not self.scheduler.wait():
+                break
     
     def check_emails(self):
-        """Check for new emails from boss"""
-        # This would connect to your email system
-        # For now, simulating with example
+        """Check for new emails from boss; returns how many were processed"""
         self.log("Checking for new emails...")
-        
+        emails = self.fetch_boss_emails()
+        for email_data in emails:
+            self.process_email(email_data)
+        return len(emails)
+    
+    def fetch_boss_emails(self):
+        """Unread emails from boss_email"""
+        # This would connect to your email system
         # Example: In real implementation, this would:
         # 1. Connect to Exchange/Outlook/IMAP
         # 2. Search for unread emails from boss_email
-        # 3. For each new email, call process_email()
-        
-        pass  # Placeholder for email checking logic
+        return []  # Placeholder for email checking logic
     
     def process_email(self, email_data):
         """Process an email from boss"""
@@ -317,14 +385,16 @@ class BossAssistant:
     
     def present_for_approval(self, email_data, task, result):
         """Present completed work for user approval"""
-        # Add to pending list
+        # Called from the monitor thread; the widgets are built on the main loop
+        self.post(self.show_approval, email_data, task, result)
+        self.log("⏳ Waiting for your approval...")
+    
+    def show_approval(self, email_data, task, result):
+        """Add to the pending list and open the approval dialog (main loop only)"""
         pending_id = f"{datetime.now().strftime('%H%M%S')}_{task['type']}"
         self.pending_list.insert(tk.END, f"📧 {email_data['subject']} - {task['type']}")
         
-        # Show approval dialog
         ApprovalDialog(self.root, email_data, task, result, self.on_approval_decision)
-        
-        self.log("⏳ Waiting for your approval...")
     
     def on_approval_decision(self, decision, feedback=None):
         """Handle approval decision"""
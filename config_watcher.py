@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Config Watcher - Picks up edits to the config file without a restart
+
+A background thread stats the config file every few seconds (no inotify
+or FSEvents, so it works everywhere). When the file changes it is parsed
+and type-checked against the defaults; a valid file is staged, an invalid
+one is reported and ignored. The assistant takes the staged config at the
+start of its next check, so a batch never sees half of an edit.
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+
+
+class ConfigError(ValueError):
+    """Config file that can't be used"""
+
+
+def check_items(key, value, item_types):
+    """Raise ConfigError unless every element (list) or value (dict) is of item_types"""
+    items = value.values() if isinstance(value, dict) else value
+    for item in items:
+        if not isinstance(item, item_types) or isinstance(item, bool) and bool not in item_types:
+            names = '/'.join(t.__name__ for t in item_types)
+            raise ConfigError(f"{key}: expected a {type(value).__name__} of {names}, got {item!r} in it")
+
+
+def validate_config(data, defaults, item_types=None):
+    """Defaults merged with data; raises ConfigError on a wrong type or value
+
+    Elements of lists and values of dicts are checked against item_types
+    ({key: tuple of types}), or else against the types in the default.
+    """
+    if not isinstance(data, dict):
+        raise ConfigError("top level must be a JSON object")
+    item_types = item_types or {}
+    for key, value in data.items():
+        default = defaults.get(key)
+        if default is None:
+            continue
+        if isinstance(default, bool):
+            ok = isinstance(value, bool)
+        elif isinstance(default, (int, float)):
+            ok = isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+        else:
+            ok = isinstance(value, type(default))
+        if not ok:
+            raise ConfigError(f"{key}: expected {type(default).__name__}, got {value!r}")
+        if isinstance(default, (list, dict)):
+            types = item_types.get(key) or tuple({type(v) for v in (
+                default.values() if isinstance(default, dict) else default)})
+            if types:
+                check_items(key, value, types)
+        # Intervals, timeouts and TTLs; 0 would mean a busy loop or an instant timeout
+        if key.endswith('_seconds') and value <= 0:
+            raise ConfigError(f"{key}: must be positive, got {value!r}")
+    return {**defaults, **data}
+
+
+def config_diff(old, new):
+    """Keys whose values differ between two configs"""
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class ConfigWatcher:
+    """Stat-polls a config file and stages validated new versions"""
+
+    def __init__(self, path, defaults, interval=2.0, log=print, on_change=None, item_types=None):
+        self.path = path
+        self.defaults = defaults
+        self.item_types = item_types
+        self.interval = interval
+        self.log = log
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.staged = None
+        self.signature = self._signature()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _signature(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        # Inode catches editors that save by renaming a new file into place
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def poll(self):
+        """Stage the file's config if it changed and is valid; True if staged"""
+        with self.lock:
+            signature = self._signature()
+            if signature == self.signature or signature is None:
+                return False
+            self.signature = signature
+            try:
+                with open(self.path) as f:
+                    self.staged = validate_config(json.load(f), self.defaults, self.item_types)
+            except (OSError, ValueError) as e:
+                self.log(f"Config not reloaded: {e}")
+                return False
+        if self.on_change:
+            self.on_change()
+        return True
+
+    @contextmanager
+    def writing(self):
+        """Wrap the assistant's own saves so they aren't mistaken for edits"""
+        with self.lock:
+            yield
+            self.signature = self._signature()
+
+    def take(self):
+        """The staged config (None if nothing changed), clearing it"""
+        with self.lock:
+            staged, self.staged = self.staged, None
+        return staged
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.poll()
+
+    def stop(self):
+        self.stop_event.set()
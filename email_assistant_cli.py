@@ -14,24 +14,77 @@ import subprocess
 from datetime import datetime
 from pathlib import Path
 import hashlib
+import statistics
 import sys
+import threading
+from collections import deque
+
+from body_normalizer import fresh_body
+from config_watcher import ConfigWatcher, config_diff
+from email_connector import EmailConnector
+from mail_priority import VIP, MailPriorityQueue, priority_level
+from poll_scheduler import PollScheduler
+from rate_limiter import get_limiter
+from result_cache import ResultCache
+from search_index import SearchIndex
+from sender_reputation import USER_WEIGHT, SenderReputation
+from skill_index import SkillIndex
+from spam_rules import DEFAULT_SPAM_WORDS, SpamRules
+from thread_index import ThreadIndex
+
+
+CONFIG_PATH = Path.home() / '.email_assistant_config.json'
+SCHEDULER_KEYS = frozenset({'check_interval_seconds', 'min_check_interval_seconds',
+                            'max_check_interval_seconds', 'poll_jitter'})
+# The backend is picked once, when the CLI starts
+RESTART_KEYS = frozenset({'mail_app', 'mail_path'})
+# Element types of the list settings whose default is empty
+CONFIG_ITEM_TYPES = {'blocked_senders': (str,), 'blocked_domains': (str,), 'vip_senders': (str,),
+                     'unsubscribed': (dict, str)}
 
 
 class EmailAssistantCLI:
     """Terminal-based Email Assistant"""
     
-    def __init__(self):
+    def __init__(self, home=None):
+        # Every file the assistant keeps lives under home (the user's by default)
+        self.config_path = Path(home) / CONFIG_PATH.name if home else CONFIG_PATH
+        self.data_dir = (Path(home) if home else Path.home()) / '.email_assistant'
         self.config = self.load_config()
         self.is_running = False
-        self.learned_skills_dir = Path.home() / '.email_assistant' / 'skills'
+        self.learned_skills_dir = self.data_dir / 'skills'
         self.learned_skills_dir.mkdir(parents=True, exist_ok=True)
+        self._skill_index = None
+        self._unsubscriber = None
+        self.probe_done = threading.Event()
+        self.probe_ok = None
         self.processed_emails = set()
-        self.stats = {'checked': 0, 'spam': 0, 'tasks': 0}
+        self.held_restored = False
+        self.stats = {'checked': 0, 'spam': 0, 'tasks': 0, 'cache_hits': 0, 'reputation_hits': 0}
+        # Seconds from fetch to first look for recent VIP mail
+        self.vip_first_looks = deque(maxlen=1000)
+        self.result_cache = ResultCache(
+            max_entries=self.config['result_cache_size'],
+            ttl_seconds=self.config['result_cache_ttl_seconds'],
+            max_disk_entries=self.config['result_cache_disk_size'],
+            cache_dir=self.data_dir / 'cache' / 'results'
+        )
+        self.thread_index = ThreadIndex(self.data_dir / 'threads.db')
+        self.search_index = SearchIndex(self.data_dir / 'search.db')
+        self.reputation = SenderReputation(path=self.data_dir / 'reputation.json',
+                                           half_life_days=self.config['reputation_half_life_days'])
+        self.connector = EmailConnector(self.config)
+        self.scheduler = PollScheduler.from_config(self.config)
+        self.spam_rules = SpamRules.from_config(self.config)
+        # An edit that changes the interval should not wait out the old one
+        self.config_watcher = ConfigWatcher(self.config_path, self.default_config(),
+                                            interval=self.config['config_poll_seconds'],
+                                            log=self.log, on_change=self.scheduler.wake,
+                                            item_types=CONFIG_ITEM_TYPES)
         
-    def load_config(self):
-        """Load configuration"""
-        config_path = Path.home() / '.email_assistant_config.json'
-        default_config = {
+    def default_config(self):
+        """Configuration defaults"""
+        return {
             'email': 'kbaker@onwasa.com',
             'check_interval_seconds': 30,
             'require_approval': True,
@@ -40,19 +93,68 @@ class EmailAssistantCLI:
             'mail_app': 'outlook',
             'whitelist_domains': ['onwasa.com', 'microsoft.com', 'apple.com'],
             'blocked_senders': [],
-            'unsubscribed': []
+            'blocked_domains': [],
+            'unsubscribed': [],
+            'result_cache_size': 256,
+            'result_cache_ttl_seconds': 7 * 24 * 3600,
+            'result_cache_disk_size': 4096,
+            'skill_match_threshold': 0.3,
+            'probe_cache_ttl_seconds': 24 * 3600,
+            'min_check_interval_seconds': 10,
+            'max_check_interval_seconds': 600,
+            'poll_jitter': 0.1,
+            'unsubscribe_workers': 8,
+            'unsubscribe_timeout_seconds': 10,
+            'reputation_half_life_days': 30,
+            'vip_senders': [],
+            'priority_aging_seconds': 300,
+            'spam_words': list(DEFAULT_SPAM_WORDS),
+            'bulk_is_spam': False,
+            'config_poll_seconds': 2
         }
-        
-        if config_path.exists():
-            with open(config_path) as f:
+    
+    def load_config(self):
+        """Load configuration"""
+        default_config = self.default_config()
+        if self.config_path.exists():
+            with open(self.config_path) as f:
                 return {**default_config, **json.load(f)}
         return default_config
     
     def save_config(self):
         """Save configuration"""
-        config_path = Path.home() / '.email_assistant_config.json'
-        with open(config_path, 'w') as f:
-            json.dump(self.config, f, indent=2)
+        with self.config_watcher.writing():
+            with open(self.config_path, 'w') as f:
+                json.dump(self.config, f, indent=2)
+    
+    def reload_config(self):
+        """Switch to a config file edited since the last check, if any
+        
+        Called between batches, so every stage of a batch sees a single
+        snapshot. Only the structures built from changed keys are rebuilt.
+        """
+        config = self.config_watcher.take()
+        if config is None:
+            return
+        changed = config_diff(self.config, config)
+        if not changed:
+            return
+        if changed & SpamRules.CONFIG_KEYS:
+            try:
+                self.spam_rules = SpamRules.from_config(config)
+            except (TypeError, ValueError, AttributeError) as e:
+                # Nothing switched yet: keep running on the previous config
+                self.log(f"Config not reloaded: {e}")
+                return
+        # Updated in place: the connector, backend and unsubscribe pool share this dict
+        self.config.update(config)
+        for key in self.config.keys() - config.keys():
+            del self.config[key]
+        if changed & SCHEDULER_KEYS:
+            self.scheduler.reconfigure(self.config)
+        self.log(f"Config reloaded ({', '.join(sorted(changed))})")
+        if changed & RESTART_KEYS:
+            self.log(f"{', '.join(sorted(changed & RESTART_KEYS))} take effect after a restart")
     
     def log(self, message):
         """Add log message"""
@@ -74,40 +176,162 @@ class EmailAssistantCLI:
         """Main run loop"""
         self.print_banner()
         
-        # Check Outlook access
-        if not self.check_outlook_access():
-            print("⚠️  Could not connect to Microsoft Outlook")
-            print("   Make sure Outlook is running and try again")
-            return
-        
-        print("✅ Connected to Microsoft Outlook")
+        # Check Outlook access in the background so the prompt is live right away
+        if self.connector.backend is not None:
+            print(f"✅ Using {self.config['mail_app']} mail backend")
+        else:
+            self.start_probe()
+            if self.probe_done.is_set() and self.probe_ok:
+                print("✅ Connected to Microsoft Outlook")
+            else:
+                print("🔍 Checking Microsoft Outlook access in the background...")
         print()
         print("Commands:")
         print("  [Enter] - Check emails now")
         print("  'auto'  - Auto-check every 5 minutes")
+        print("  'stats' - Show statistics")
+        print("  'search <query>' - Search processed mail")
         print("  'quit'  - Exit")
         print()
         
+        self.config_watcher.start()
+        
         while True:
             try:
-                cmd = input("> ").strip().lower()
+                line = input("> ").strip()
+                cmd = line.lower()
                 
                 if cmd == 'quit' or cmd == 'q':
                     print("Goodbye!")
+                    self.reputation.save()
                     break
                 elif cmd == 'auto' or cmd == 'a':
                     self.auto_mode()
+                elif cmd == 'stats':
+                    self.print_stats()
+                elif cmd.startswith('search '):
+                    print_search_results(line[7:].strip(), self.search_index.search)
                 elif cmd == '':
                     self.check_once()
                 else:
-                    print("Unknown command. Use: [Enter], 'auto', or 'quit'")
+                    print("Unknown command. Use: [Enter], 'auto', 'stats', 'search <query>', or 'quit'")
                     
             except KeyboardInterrupt:
                 print("\nGoodbye!")
+                self.reputation.save()
                 break
     
+    def print_stats(self):
+        """Print session statistics"""
+        cache = self.result_cache.stats
+        print(f"Checked: {self.stats['checked']}  Spam: {self.stats['spam']}  Tasks: {self.stats['tasks']}")
+        print(f"Sender reputation: {len(self.reputation.entries)} sender(s)/domain(s), "
+              f"{self.stats['reputation_hits']} message(s) judged on reputation alone")
+        first_look = self.first_look_summary()
+        if first_look:
+            print(f"VIP mail: {first_look['count']} message(s), first look after "
+                  f"{first_look['median_seconds']:.1f}s median, {first_look['max_seconds']:.1f}s max")
+        print(f"Result cache: {cache['hits']} hit(s), {cache['misses']} miss(es), "
+              f"{self.result_cache.hit_rate():.0%} hit rate, {len(self.result_cache.entries)} in memory")
+        limits = get_limiter(self.config).metrics
+        print(f"Server calls: {limits['calls']}, throttled {limits['throttle_events']} time(s), "
+              f"{limits['retries']} retr(ies), {limits['wait_seconds']:.1f}s spent waiting")
+        triage = self.connector.stats
+        fetched = triage['header_only'] + triage['full']
+        if fetched:
+            print(f"Header stage: {triage['header_only']} of {fetched} decided without a body, "
+                  f"{triage['dropped']} blocked before fetch")
+        unsubscribed = [e for e in self.config['unsubscribed'] if isinstance(e, dict)]
+        if unsubscribed or self._unsubscriber:
+            done = sum(1 for e in unsubscribed if e['status'] == 'ok')
+            running = self._unsubscriber.pending() if self._unsubscriber else 0
+            print(f"Unsubscribed: {done} list(s), {len(unsubscribed) - done} failed or manual, "
+                  f"{running} in progress")
+        message_cache = getattr(self.connector.backend, 'cache', None)
+        if message_cache:
+            print(f"Message cache: {message_cache.stats['hits']} hit(s), "
+                  f"{message_cache.stats['misses']} miss(es), "
+                  f"{message_cache.total_bytes / 1e6:.1f} of {message_cache.max_bytes / 1e6:.0f} MB")
+        transfer = getattr(self.connector.backend, 'transfer', None)
+        if transfer and transfer['bytes_in']:
+            print(f"IMAP transfer: {transfer['bytes_in'] / 1024:.0f} KB received "
+                  f"({transfer['bytes_in_raw'] / transfer['bytes_in']:.1f}x compression), "
+                  f"{transfer['bytes_out'] / 1024:.0f} KB sent")
+    
+    @property
+    def skill_index(self):
+        """Skill index, built on first use"""
+        if self._skill_index is None:
+            self._skill_index = SkillIndex.from_dir(self.learned_skills_dir)
+        return self._skill_index
+    
+    @property
+    def unsubscriber(self):
+        """Unsubscribe pool, started on first use"""
+        if self._unsubscriber is None:
+            from unsubscriber import Unsubscriber
+            self._unsubscriber = Unsubscriber(
+                self.config, on_result=self.record_unsubscribe,
+                workers=self.config['unsubscribe_workers'],
+                timeout=self.config['unsubscribe_timeout_seconds']
+            )
+        return self._unsubscriber
+    
+    def record_unsubscribe(self, entry):
+        """Store an unsubscribe outcome (runs on a pool thread)"""
+        self.config['unsubscribed'].append(entry)
+        self.save_config()
+        if entry['status'] == 'manual':
+            self.log(f"Unsubscribe from {entry['sender']} needs a browser: {entry['uri']}")
+        elif entry['status'] == 'failed':
+            self.log(f"Unsubscribe from {entry['sender']} failed: {entry['error']}")
+    
+    def start_probe(self):
+        """Probe Outlook access, from the probe cache or in a background thread"""
+        cache_path = self.data_dir / 'probe_cache.json'
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if time.time() - cached['outlook'] < self.config['probe_cache_ttl_seconds']:
+                self.probe_ok = True
+                self.probe_done.set()
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        def probe():
+            self.probe_ok = self.check_outlook_access()
+            if self.probe_ok:
+                # Only successes are cached; a failed probe is retried next start
+                try:
+                    with open(cache_path, 'w') as f:
+                        json.dump({'outlook': time.time()}, f)
+                except OSError:
+                    pass
+            self.probe_done.set()
+        
+        threading.Thread(target=probe, daemon=True).start()
+    
+    def backend_ready(self):
+        """Wait for the Outlook probe if needed; False if there is no mail source"""
+        if self.connector.backend is not None:
+            return True
+        if not self.probe_done.is_set():
+            self.start_probe()
+            self.probe_done.wait()
+        if not self.probe_ok:
+            print("⚠️  Could not connect to Microsoft Outlook")
+            print("   Make sure Outlook is running and try again")
+            # Probe again on the next check
+            self.probe_done.clear()
+            return False
+        return True
+    
     def check_outlook_access(self):
         """Check if we can access Outlook"""
+        if sys.platform != 'darwin':
+            # No osascript off macOS; don't pay for a spawn that can only fail
+            return False
         try:
             script = '''
             tell application "Microsoft Outlook"
@@ -121,42 +345,124 @@ class EmailAssistantCLI:
     
     def auto_mode(self):
         """Auto-check mode"""
-        print(f"\n🔄 Auto-mode: Checking every {self.config['check_interval_seconds'] // 60} minutes")
+        print(f"\n🔄 Auto-mode: Checking every {self.config['check_interval_seconds'] // 60} minutes "
+              f"(sooner after new mail, less often when quiet)")
         print("Press Ctrl+C to stop\n")
         
+        self.scheduler.reset()
         try:
             while True:
-                self.check_once()
-                time.sleep(self.config['check_interval_seconds'])
+                self.scheduler.record(self.check_once())
+                self.scheduler.wait()
         except KeyboardInterrupt:
             print("\n\n⏹️  Auto-mode stopped")
             print()
     
     def check_once(self):
-        """Check emails once"""
+        """Check emails once; returns the number of new emails"""
+        self.reload_config()
+        if not self.backend_ready():
+            return 0
         self.log("Checking for new emails...")
-        emails = self.check_emails_macos()
+        fetched_at = time.time()
+        emails = self.fetch_new_emails()
         self.stats['checked'] += len(emails)
+        threads = self.restore_held()
         
-        if not emails:
+        if not emails and not threads:
             self.log("No new emails")
-            return
+            self.connector.commit()
+            return 0
         
-        self.log(f"Found {len(emails)} new email(s)")
+        if threads:
+            self.log(f"{len(threads)} deferred email(s) from an earlier session")
+        if emails:
+            self.log(f"Found {len(emails)} new email(s)")
+        threads.update(self.collect_threads(emails))
+        
+        for root, email_data, level in self.prioritize(threads, fetched_at):
+            if email_data['thread_count'] > 1:
+                self.log(f"Thread has {email_data['thread_count']} messages - handling the latest")
+            if level == VIP:
+                self.vip_first_looks.append(time.time() - fetched_at)
+            self.process_email_interactive(email_data)
+            if email_data.get('deferred'):
+                # Kept in threads.db, since the backend is about to move past it
+                self.thread_index.hold(root, email_data)
+            else:
+                self.thread_index.resolve(root)
+        # Only now may the backend move its sync position past these emails
+        self.connector.commit()
+        return len(emails)
+    
+    def restore_held(self):
+        """{thread root: email} deferred in an earlier session (first check only)"""
+        if self.held_restored:
+            return {}
+        self.held_restored = True
+        threads = {}
+        for root, email_data, _ in self.thread_index.held():
+            self.processed_emails.add(self.get_email_id(email_data))
+            threads[root] = email_data
+        return threads
+    
+    def collect_threads(self, emails):
+        """Fold new emails into their threads; returns {thread root: latest email}
         
+        Each conversation is then handled once, using only its latest message.
+        """
+        threads = {}
         for email_data in emails:
             email_id = self.get_email_id(email_data)
             if email_id in self.processed_emails:
                 continue
             self.processed_emails.add(email_id)
             
-            self.process_email_interactive(email_data)
+            root = self.thread_index.add_message(email_data)
+            threads[root] = self.thread_index.merge_pending(root, email_data)
+        return threads
+    
+    def prioritize(self, threads, queued_at=None):
+        """Yield (thread root, latest email, level), boss and VIP mail first
+        
+        Ordered by sender rules, header verdict and reputation, aged by
+        queued_at so low-priority mail still gets its turn.
+        """
+        queue = MailPriorityQueue(self.config['priority_aging_seconds'])
+        for root, email_data in threads.items():
+            level = priority_level(email_data, self.config, self.reputation)
+            queue.push((root, email_data), level, queued_at)
+        while queue:
+            (root, email_data), level, _ = queue.pop()
+            yield root, email_data, level
+    
+    def first_look_summary(self):
+        """Time-to-first-look for VIP mail (None until there is some)"""
+        if not self.vip_first_looks:
+            return None
+        return {
+            'count': len(self.vip_first_looks),
+            'median_seconds': round(statistics.median(self.vip_first_looks), 3),
+            'max_seconds': round(max(self.vip_first_looks), 3)
+        }
     
     def get_email_id(self, email_data):
         """Generate unique ID for email"""
         content = f"{email_data.get('from', '')}{email_data.get('subject', '')}{email_data.get('date', '')}"
         return hashlib.md5(content.encode()).hexdigest()
     
+    def fetch_new_emails(self):
+        """Fetch new emails from the configured backend"""
+        if self.connector.backend is None:
+            return self.check_emails_macos()
+        try:
+            return self.connector.check_for_emails()
+        except Exception as e:
+            self.log(f"Error checking emails: {e}")
+            if getattr(e, 'retry_after', None):
+                self.scheduler.throttle(e.retry_after)
+            return []
+    
     def check_emails_macos(self):
         """Check for new emails using Microsoft Outlook for Mac"""
         emails = []
@@ -215,6 +521,9 @@ class EmailAssistantCLI:
     
     def mark_email_read(self, email_id):
         """Mark an email as read in Outlook"""
+        if self.connector.backend is not None:
+            self.connector.mark_read([email_id])
+            return
         try:
             script = f'''
             tell application "Microsoft Outlook"
@@ -226,11 +535,20 @@ class EmailAssistantCLI:
         except:
             pass
     
+    def mark_handled(self, email_data):
+        """Mark an email and the rest of its thread as read"""
+        ids = [i for i in email_data.get('thread_ids') or [email_data.get('id')] if i]
+        if self.connector.backend is not None:
+            self.connector.mark_read(ids)
+            return
+        for email_id in ids:
+            self.mark_email_read(email_id)
+    
     def process_email_interactive(self, email_data):
         """Process email with user interaction"""
         sender = email_data.get('from', '')
         subject = email_data.get('subject', '')
-        body = email_data.get('body', '')
+        body = fresh_body(email_data)
         
         print()
         print("="*60)
@@ -251,7 +569,11 @@ class EmailAssistantCLI:
         
         if is_spam:
             print("🚫 SPAM DETECTED")
-            self.handle_spam_interactive(email_data)
+            self.search_index.add(email_data, body, 'spam')
+            if self.config['auto_unsubscribe'] and email_data.get('list_unsubscribe'):
+                self.auto_unsubscribe(email_data)
+            else:
+                self.handle_spam_interactive(email_data)
         else:
             print("✅ Legitimate email")
             self.handle_work_email_interactive(email_data)
@@ -261,23 +583,29 @@ class EmailAssistantCLI:
         if not self.config['spam_detection']:
             return False
         
-        sender = email_data.get('from', '').lower()
-        subject = email_data.get('subject', '').lower()
-        body = email_data.get('body', '').lower()
+        # Settled on the headers, before any body was fetched
+        verdict = email_data.get('header_verdict')
+        if verdict == 'spam' or (verdict == 'bulk' and self.config['bulk_is_spam']):
+            return True
+        if verdict in ('ham', 'auto'):
+            return False
+        
+        rules = self.spam_rules
         
         # Check whitelist
-        for domain in self.config.get('whitelist_domains', []):
-            if domain.lower() in sender:
-                return False
+        if rules.whitelisted(email_data.get('from', '')):
+            return False
         
-        spam_score = 0
-        spam_words = ['unsubscribe', 'promotional', 'marketing', 'limited time', 'act now', 
-                      'click here', 'buy now', 'order now', 'special offer', 'free gift',
-                      'congratulations', 'winner', 'claim now', 'urgent', 'important notice']
+        # Senders we have judged often enough skip the keyword scan
+        verdict = self.reputation.verdict(email_data.get('from', ''))
+        if verdict:
+            self.stats['reputation_hits'] += 1
+            return verdict == 'spam'
         
-        for word in spam_words:
-            if word in subject or word in body:
-                spam_score += 1
+        subject = email_data.get('subject', '').lower()
+        body = fresh_body(email_data).lower()
+        
+        spam_score = len(rules.keyword_hits(subject, body))
         
         if subject.count('!') > 2 or subject.count('?') > 2:
             spam_score += 1
@@ -285,12 +613,12 @@ class EmailAssistantCLI:
         if 'unsubscribe' in body or 'opt-out' in body:
             spam_score += 2
         
-        return spam_score >= 3
+        is_spam = spam_score >= 3
+        self.reputation.record(email_data.get('from', ''), is_spam)
+        return is_spam
     
     def handle_spam_interactive(self, email_data):
         """Handle spam with user input"""
-        sender = email_data.get('from', '')
-        
         print()
         print("Options:")
         print("  [u] Unsubscribe & Block sender")
@@ -299,19 +627,31 @@ class EmailAssistantCLI:
         print("  [i] Ignore (skip)")
         
         choice = input("Your choice [u/b/n/i]: ").strip().lower()
+        self.apply_spam_decision(email_data, choice)
+    
+    def apply_spam_decision(self, email_data, choice):
+        """Act on a spam decision (u/b/n/i)"""
+        sender = email_data.get('from', '')
+        
+        decisions = {'u': 'unsubscribed', 'b': 'blocked', 'n': 'not_spam'}
+        self.search_index.set_decision(email_data, decisions.get(choice, 'ignored'))
+        if choice in decisions:
+            self.reputation.record(sender, choice != 'n', USER_WEIGHT)
         
         if choice == 'u':
             print(f"✅ Unsubscribing and blocking {sender}")
+            if not email_data.get('list_unsubscribe'):
+                print("   No List-Unsubscribe header - blocking only")
+            elif self.unsubscriber.submit(email_data) is None:
+                print("   Already unsubscribed from this list")
             self.block_sender(sender)
             self.stats['spam'] += 1
-            if email_data.get('id'):
-                self.mark_email_read(email_data['id'])
+            self.mark_handled(email_data)
         elif choice == 'b':
             print(f"✅ Blocking {sender}")
             self.block_sender(sender)
             self.stats['spam'] += 1
-            if email_data.get('id'):
-                self.mark_email_read(email_data['id'])
+            self.mark_handled(email_data)
         elif choice == 'n':
             print(f"✅ Marked as not spam: {sender}")
             domain = sender.split('@')[-1]
@@ -321,6 +661,19 @@ class EmailAssistantCLI:
         else:
             print("ℹ️  Skipped")
     
+    def auto_unsubscribe(self, email_data):
+        """Unsubscribe from mail the spam score flagged, without an operator
+        
+        Only a heuristic verdict, so the sender is not blocked and reputation
+        keeps just the weight-1 verdict is_spam_email already recorded.
+        """
+        print(f"✅ Unsubscribing from {email_data.get('from', '')}")
+        self.search_index.set_decision(email_data, 'auto_unsubscribed')
+        if self.unsubscriber.submit(email_data) is None:
+            print("   Already unsubscribed from this list")
+        self.stats['spam'] += 1
+        self.mark_handled(email_data)
+    
     def block_sender(self, sender):
         """Add sender to block list"""
         if sender not in self.config['blocked_senders']:
@@ -330,30 +683,18 @@ class EmailAssistantCLI:
     
     def handle_work_email_interactive(self, email_data):
         """Handle work email with user input"""
-        task = self.parse_task(email_data)
+        work = self.prepare_work(email_data)
         
-        if task['type'] == 'unknown':
+        if work is None:
             print("ℹ️  No actionable task detected")
             print("  [r] Mark as read")
             print("  [s] Skip")
             choice = input("Your choice [r/s]: ").strip().lower()
-            if choice == 'r' and email_data.get('id'):
-                self.mark_email_read(email_data['id'])
+            self.apply_info_decision(email_data, choice)
             return
         
-        print(f"\n🎯 Task detected: {task['type']}")
-        print(f"   Request: {task['extracted_request']}")
-        
-        # Find or learn skill
-        skill = self.find_skill(task['type'])
-        if not skill:
-            skill = self.learn_skill(task)
-        
-        # Execute skill
-        result = self.execute_skill(skill, task)
-        
         print(f"\n🤖 What I can do:")
-        print(f"   {result['output']}")
+        print(f"   {work['result']['output']}")
         
         print()
         print("Options:")
@@ -363,25 +704,74 @@ class EmailAssistantCLI:
         print("  [r] Reject/mark as read")
         
         choice = input("Your choice [a/e/d/r]: ").strip().lower()
+        self.apply_work_decision(email_data, work, choice)
+    
+    def prepare_work(self, email_data):
+        """Parse the task and produce a result to approve (None if no task)"""
+        task = self.parse_task(email_data)
+        # Auto-replies and notifications (decided on headers) never carry a request
+        if task['type'] == 'unknown' or email_data.get('header_verdict') == 'auto':
+            self.search_index.add(email_data, fresh_body(email_data), 'info')
+            return None
+        self.search_index.add(email_data, fresh_body(email_data), 'task', task['type'])
+        
+        print(f"\n🎯 Task detected: {task['type']}")
+        print(f"   Request: {task['extracted_request']}")
         
+        # The skill that would run decides the output, so results are cached under it
+        skill = self.match_skill(task) or self.find_skill(task['type'])
+        # A skill learned below is named after the task type
+        skill_name = skill['name'] if skill else task['type']
+        
+        # Reuse a previously approved result for the same request
+        cache_key = self.result_cache.key_for(skill_name, task, email_data)
+        result = self.result_cache.get(cache_key)
+        if result:
+            self.stats['cache_hits'] += 1
+            print("   ♻️  Same request was approved before - reusing that result")
+        else:
+            if not skill:
+                skill = self.learn_skill(task)
+            
+            # Execute skill
+            result = self.execute_skill(skill, task)
+        
+        return {'task': task, 'skill': skill, 'skill_name': skill_name, 'result': result,
+                'cache_key': cache_key}
+    
+    def apply_info_decision(self, email_data, choice):
+        """Act on a decision for mail with no task (r/s)"""
+        self.search_index.set_decision(email_data, 'read' if choice == 'r' else 'skipped')
+        if choice == 'r':
+            self.mark_handled(email_data)
+    
+    def apply_work_decision(self, email_data, work, choice):
+        """Act on a work decision (a/e/d/r)"""
+        decisions = {'a': 'approved', 'e': 'editing', 'r': 'rejected'}
+        self.search_index.set_decision(email_data, decisions.get(choice, 'deferred'))
+        # A deferred item decided later is no longer deferred
+        email_data.pop('deferred', None)
         if choice == 'a':
             print("✅ Approved! Marking as complete...")
+            self.reputation.record(email_data.get('from', ''), False, USER_WEIGHT)
             self.stats['tasks'] += 1
-            if email_data.get('id'):
-                self.mark_email_read(email_data['id'])
+            self.result_cache.put(work['cache_key'], work['skill_name'], work['result'])
+            if work['skill']:
+                self.add_skill_example(work['skill'], work['task'])
+            self.mark_handled(email_data)
         elif choice == 'e':
             print("✏️  Opening editor... (not implemented in CLI)")
         elif choice == 'r':
             print("❌ Rejected. Marking as read...")
-            if email_data.get('id'):
-                self.mark_email_read(email_data['id'])
+            self.mark_handled(email_data)
         else:
             print("⏳ Deferred")
+            email_data['deferred'] = True
     
     def parse_task(self, email_data):
         """Parse what task needs to be done"""
         subject = email_data.get('subject', '').lower()
-        body = email_data.get('body', '').lower()
+        body = fresh_body(email_data).lower()
         
         task_types = {
             r'report|spreadsheet|excel|numbers': 'generate_report',
@@ -406,7 +796,7 @@ class EmailAssistantCLI:
         
         return {
             'type': task_type,
-            'description': email_data.get('body', ''),
+            'description': fresh_body(email_data),
             'extracted_request': request,
             'from': email_data.get('from', ''),
             'subject': email_data.get('subject', '')
@@ -414,7 +804,7 @@ class EmailAssistantCLI:
     
     def extract_request(self, email_data):
         """Extract the specific request from email"""
-        body = email_data.get('body', '')
+        body = fresh_body(email_data)
         lines = body.split('\n')
         
         for line in lines:
@@ -438,8 +828,37 @@ class EmailAssistantCLI:
                 return json.load(f)
         return None
     
+    def match_skill(self, task):
+        """Find the learned skill whose examples are nearest to this request"""
+        matches = self.skill_index.match(task['extracted_request'], k=3)
+        if not matches or matches[0][1] < self.config['skill_match_threshold']:
+            return None
+        
+        name, score = matches[0]
+        skill = self.find_skill(name)
+        if skill:
+            others = ', '.join(f"{n} ({s:.2f})" for n, s in matches[1:])
+            print(f"   📚 Matched skill: {name} ({score:.2f})" + (f" - also: {others}" if others else ""))
+        return skill
+    
+    def add_skill_example(self, skill, task):
+        """Remember an approved request as another example of a skill"""
+        request = task['extracted_request']
+        if request in skill.setdefault('examples', []):
+            return
+        skill['examples'].append(request)
+        with open(self.learned_skills_dir / f"{skill['name']}.json", 'w') as f:
+            json.dump(skill, f, indent=2)
+        self.skill_index.add_example(skill['name'], request)
+    
     def learn_skill(self, task):
         """Learn/create a new skill for this task type"""
+        existing = self.find_skill(task['type'])
+        if existing:
+            # Keep what the skill already learned instead of overwriting it
+            self.add_skill_example(existing, task)
+            return existing
+        
         skill = {
             'name': task['type'],
             'type': task['type'],
@@ -458,6 +877,10 @@ class EmailAssistantCLI:
         skill_file = self.learned_skills_dir / f"{task['type']}.json"
         with open(skill_file, 'w') as f:
             json.dump(skill, f, indent=2)
+        self.skill_index.add_example(skill['name'], task['extracted_request'])
+        
+        # Results from the old version of this skill are no longer valid
+        self.result_cache.invalidate_skill(skill['name'])
         
         print(f"   📚 Created new skill: {skill['name']}")
         return skill
@@ -474,17 +897,147 @@ class EmailAssistantCLI:
             'general_task': f"Complete: {task['extracted_request']}"
         }
         
+        output = outputs.get(skill['name'], f"Complete: {task['extracted_request']}")
+        if skill['name'] == 'research':
+            for hit in self.search_index.related(task['extracted_request']):
+                output += f"\n   • {hit['subject']} ({hit['from']}): {hit['snippet']}"
+        
         return {
             'success': True,
-            'output': outputs.get(skill['name'], f"Complete: {task['extracted_request']}"),
+            'output': output,
             'files': [],
             'details': f"Executed {len(skill['steps'])} steps"
         }
 
 
+def print_search_results(query, search):
+    """Run a search and print ranked hits with snippets"""
+    if not query:
+        print("Usage: search <query>")
+        return
+    started = time.perf_counter()
+    hits = search(query)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"🔍 {len(hits)} result(s) for '{query}' ({elapsed:.0f} ms)")
+    for hit in hits:
+        labels = '/'.join(v for v in (hit['verdict'], hit['task_type'], hit['decision']) if v)
+        print(f"  [{labels}] {hit['subject']} — {hit['from']} {hit['date']}")
+        print(f"      {hit['snippet']}")
+
+
+def run_client(client):
+    """Thin client loop against a running daemon"""
+    status = client.call('status')
+    print("="*60)
+    print("📧  EMAIL ASSISTANT - connected to daemon")
+    print("="*60)
+    print(f"Daemon pid {status['pid']}, up {status['uptime_seconds'] // 60} min, "
+          f"{status['pending']} pending approval(s)")
+    print()
+    print("Commands:")
+    print("  [Enter] - Check emails now and review pending items")
+    print("  'stats' - Show statistics")
+    print("  'search <query>' - Search processed mail")
+    print("  'quit'  - Exit (the daemon keeps running)")
+    print()
+    
+    while True:
+        try:
+            line = input("> ").strip()
+            cmd = line.lower()
+            
+            if cmd == 'quit' or cmd == 'q':
+                print("Goodbye!")
+                break
+            elif cmd.startswith('search '):
+                print_search_results(line[7:].strip(), lambda q: client.call('search', query=q))
+            elif cmd == 'stats':
+                stats = client.call('stats')
+                cache = stats['result_cache']
+                print(f"Checked: {stats['checked']}  Spam: {stats['spam']}  Tasks: {stats['tasks']}")
+                print(f"Result cache: {cache['hits']} hit(s), {cache['misses']} miss(es), "
+                      f"{cache['hit_rate']:.0%} hit rate")
+            elif cmd == '':
+                client.call('check')
+                review_pending(client)
+            else:
+                print("Unknown command. Use: [Enter], 'stats', 'search <query>', or 'quit'")
+                
+        except KeyboardInterrupt:
+            print("\nGoodbye!")
+            break
+
+
+def review_pending(client):
+    """Walk through the daemon's pending approvals"""
+    items = client.call('pending')
+    if not items:
+        print("No pending items")
+        return
+    
+    labels = {'spam': "🚫 SPAM DETECTED", 'task': "🎯 Task", 'info': "ℹ️  No actionable task detected"}
+    for item in items:
+        print()
+        print("="*60)
+        print(f"From:    {item['from']}")
+        print(f"Subject: {item['subject']}")
+        print(f"Preview: {item['preview']}...")
+        print(labels[item['kind']] + (f": {item['task_type']}" if item['kind'] == 'task' else ""))
+        if item['kind'] == 'task':
+            print(f"   Request: {item['request']}")
+            print("\n🤖 What I can do:")
+            print(f"   {item['output']}")
+        
+        choice = input(f"Your choice [{'/'.join(item['choices'])}]: ").strip().lower()
+        result = client.call('decide', item_id=item['id'], choice=choice)
+        print("⏳ Deferred" if result['deferred'] else "✅ Done")
+
+
 def main():
     print()
+    if '--daemon' in sys.argv:
+        if '--shards' in sys.argv:
+            # Folders are spread over worker processes
+            from shard_coordinator import ShardCoordinator
+            
+            daemon = ShardCoordinator(EmailAssistantCLI(), int(sys.argv[sys.argv.index('--shards') + 1]))
+        else:
+            from assistant_daemon import AssistantDaemon
+            
+            daemon = AssistantDaemon(EmailAssistantCLI())
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            daemon.stop()
+        return
+    
+    # Attach to a running daemon so its state and caches survive UI restarts
+    if '--local' not in sys.argv and '--record' not in sys.argv:
+        from assistant_daemon import DaemonClient
+        
+        try:
+            client = DaemonClient()
+        except OSError:
+            client = None
+        if client:
+            try:
+                run_client(client)
+            finally:
+                client.close()
+            return
+    
     assistant = EmailAssistantCLI()
+    if '--record' in sys.argv:
+        # Capture messages, answers and timings for session_replay.py
+        from session_replay import Recorder
+        
+        recorder = Recorder(sys.argv[sys.argv.index('--record') + 1])
+        recorder.attach(assistant)
+        try:
+            assistant.run()
+        finally:
+            recorder.close()
+        return
     assistant.run()
 
 
@@ -3,27 +3,62 @@
 Email Connector - Connects to various email systems
 """
 
-import imaplib
-import email
-from email.header import decode_header
-import json
+from datetime import datetime
 from pathlib import Path
 
+# imaplib, email, ssl and the backend modules are imported on first use so
+# that starting the assistant doesn't pay for backends it never touches
+
 
 class EmailConnector:
-    """Connect to email and check for boss emails"""
+    """Connect to email and check for boss emails
+    
+    All mail sources go through one MailBackend picked from the 'mail_app'
+    config key: 'imap', 'graph', or 'maildir'/'mbox' (with 'mail_path').
+    'outlook' has no backend here; the CLI drives Outlook via AppleScript.
+    folder is an IMAP folder, or a Maildir subfolder of 'mail_path'.
+    """
     
-    def __init__(self, config):
+    def __init__(self, config, folder='INBOX'):
         self.config = config
+        self.folder = folder
         self.last_check = None
-        
+        self.backend = self.create_backend()
+        self.stats = {'header_only': 0, 'full': 0, 'dropped': 0}
+    
+    def create_backend(self):
+        """Create the backend for the configured mail source"""
+        mail_app = self.config.get('mail_app', 'outlook')
+        if mail_app in ('maildir', 'mbox', 'local'):
+            from local_backend import LocalMailBackend
+            if self.folder != 'INBOX':
+                return LocalMailBackend(Path(self.config['mail_path']).expanduser() / self.folder)
+            return LocalMailBackend(self.config['mail_path'])
+        if mail_app == 'imap':
+            from email_imap import ImapBackend
+            return ImapBackend(self.config, self.folder)
+        if mail_app == 'graph':
+            return self.connect_outlook_exchange()
+        return None
+    
     def connect_outlook_exchange(self):
-        """Connect to Outlook/Exchange"""
-        # Would use exchangelib or Microsoft Graph API
-        pass
+        """Connect to Outlook/Exchange via Microsoft Graph"""
+        from email_oauth import get_oauth_token, get_token_manager
+        from graph_backend import GRAPH_URL, GraphBackend
+        from rate_limiter import get_limiter
+        
+        if not get_oauth_token():
+            return None
+        return GraphBackend(
+            get_token_manager().get_access_token,
+            base_url=self.config.get('graph_url', GRAPH_URL),
+            limiter=get_limiter(self.config)
+        )
     
     def connect_imap(self, server, username, password):
         """Connect via IMAP"""
+        import imaplib
+        
         try:
             mail = imaplib.IMAP4_SSL(server)
             mail.login(username, password)
@@ -32,19 +67,57 @@ class EmailConnector:
             print(f"IMAP connection error: {e}")
             return None
     
-    def check_for_emails(self, boss_email):
-        """Check for new emails from boss"""
-        new_emails = []
+    def check_for_emails(self, boss_email=None, body_length=None):
+        """Check for new emails (only from boss_email if given)"""
+        if self.backend is None:
+            return []
         
-        # This is a placeholder - real implementation would:
-        # 1. Connect to email server
-        # 2. Search for unread emails from boss_email
-        # 3. Return list of email data
+        from header_classifier import classify_headers, needs_body as verdict_needs_body
+        from mail_priority import priority_level
         
+        def keep(email_data):
+            if boss_email and boss_email.lower() not in email_data.get('from', '').lower():
+                return False
+            email_data['header_verdict'] = classify_headers(email_data, self.config)
+            if email_data['header_verdict'] == 'blocked':
+                self.stats['dropped'] += 1
+                return False
+            # Backends fetch bodies in this order, boss and VIP mail first
+            email_data['priority'] = priority_level(email_data, self.config)
+            return True
+        
+        def needs_body(email_data):
+            if verdict_needs_body(email_data['header_verdict'], self.config):
+                self.stats['full'] += 1
+                return True
+            self.stats['header_only'] += 1
+            return False
+        
+        # Backends that can fetch headers alone only download bodies of
+        # kept mail the header stage could not decide
+        new_emails = self.backend.fetch_new(keep=keep, body_length=body_length, needs_body=needs_body)
+        self.last_check = datetime.now()
         return new_emails
     
+    def commit(self):
+        """Tell the backend the last fetched emails have been handled"""
+        if self.backend is not None:
+            self.backend.commit()
+    
+    def mark_read(self, ids):
+        """Mark messages read in one batch"""
+        if self.backend is not None and ids:
+            self.backend.mark_read(list(ids))
+    
+    def move(self, ids, folder):
+        """Move messages to another folder in one batch"""
+        if self.backend is not None and ids:
+            self.backend.move(list(ids), folder)
+    
     def parse_email(self, raw_email):
         """Parse raw email into dict"""
+        import email
+        
         msg = email.message_from_bytes(raw_email)
         
         subject = self.decode_header(msg["Subject"])
@@ -65,11 +138,16 @@ class EmailConnector:
             'subject': subject,
             'from': from_addr,
             'body': body,
-            'date': msg["Date"]
+            'date': msg["Date"],
+            'message_id': msg.get("Message-ID", ""),
+            'in_reply_to': msg.get("In-Reply-To", ""),
+            'references': msg.get("References", "")
         }
     
     def decode_header(self, header):
         """Decode email header"""
+        from email.header import decode_header
+        
         if header is None:
             return ""
         decoded = decode_header(header)
@@ -7,8 +7,123 @@ import imaplib
 import email
 from email.header import decode_header
 import json
+import re
+import zlib
 from pathlib import Path
 
+from mail_backend import (
+    BATCH_FLAGS, HEADER_FETCH, HEADER_NAMES, SERVER_SEARCH,
+    MailBackend, header_fields, plain_text_body
+)
+from message_cache import DEFAULT_MAX_BYTES, MessageCache
+from message_record import MessageRecord, parse_sender
+from rate_limiter import check_imap_response, get_limiter
+
+# UIDs per FETCH/STORE command; a throttled chunk is retried on its own
+UID_CHUNK = 50
+
+# Only the headers the classifiers read, not the whole header block
+HEADER_ITEM = f"BODY.PEEK[HEADER.FIELDS ({' '.join(HEADER_NAMES).upper()})]"
+
+# Bytes of NOT FROM criteria per SEARCH; servers cap command lines (often at 8 KB)
+SEARCH_CRITERIA_LIMIT = 4000
+
+# Just the sender, to re-check what a FROM search matched
+SENDER_ITEM = 'BODY.PEEK[HEADER.FIELDS (FROM)]'
+
+# imaplib only sends commands it knows about
+imaplib.Commands.setdefault('COMPRESS', ('AUTH', 'SELECTED'))
+
+
+def new_transfer_stats():
+    """Byte counters: on the wire vs. before compression / after decompression"""
+    return {'bytes_in': 0, 'bytes_in_raw': 0, 'bytes_out': 0, 'bytes_out_raw': 0}
+
+
+class CompressingIMAP4_SSL(imaplib.IMAP4_SSL):
+    """IMAP4_SSL with RFC 4978 COMPRESS=DEFLATE and byte counters"""
+    
+    def __init__(self, *args, transfer=None, **kwargs):
+        self.transfer = transfer if transfer is not None else new_transfer_stats()
+        self.compressor = None
+        self.decompressor = None
+        self.inbuf = b''
+        super().__init__(*args, **kwargs)
+    
+    def compress(self):
+        """Switch the stream to DEFLATE if the server offers it; returns True if enabled"""
+        if self.compressor is not None:
+            return True
+        # Servers often only advertise COMPRESS once logged in
+        capabilities = set(self.capabilities)
+        typ, data = self.capability()
+        if typ == 'OK' and data and data[-1]:
+            capabilities.update(data[-1].decode(errors='replace').upper().split())
+        if 'COMPRESS=DEFLATE' not in capabilities:
+            return False
+        typ, _ = self._simple_command('COMPRESS', 'DEFLATE')
+        if typ != 'OK':
+            return False
+        # Raw deflate (no zlib header), as the RFC requires
+        self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        self.decompressor = zlib.decompressobj(-15)
+        return True
+    
+    def _fill(self):
+        """Read and inflate the next chunk from the wire"""
+        chunk = self.file.read1(16384)
+        if not chunk:
+            raise self.abort('socket error: EOF')
+        self.transfer['bytes_in'] += len(chunk)
+        data = self.decompressor.decompress(chunk)
+        self.transfer['bytes_in_raw'] += len(data)
+        self.inbuf += data
+    
+    def read(self, size):
+        if self.decompressor is None:
+            data = super().read(size)
+            self.transfer['bytes_in'] += len(data)
+            self.transfer['bytes_in_raw'] += len(data)
+            return data
+        while len(self.inbuf) < size:
+            self._fill()
+        data, self.inbuf = self.inbuf[:size], self.inbuf[size:]
+        return data
+    
+    def readline(self):
+        if self.decompressor is None:
+            line = super().readline()
+            self.transfer['bytes_in'] += len(line)
+            self.transfer['bytes_in_raw'] += len(line)
+            return line
+        while True:
+            end = self.inbuf.find(b'\n')
+            if end >= 0:
+                break
+            if len(self.inbuf) > imaplib._MAXLINE:
+                raise self.error(f"got more than {imaplib._MAXLINE} bytes")
+            self._fill()
+        line, self.inbuf = self.inbuf[:end + 1], self.inbuf[end + 1:]
+        return line
+    
+    def send(self, data):
+        self.transfer['bytes_out_raw'] += len(data)
+        if self.compressor is not None:
+            data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.transfer['bytes_out'] += len(data)
+        super().send(data)
+
+
+def open_imap(config, transfer=None):
+    """Connect and log in, enabling compression unless 'imap_compress' is off"""
+    server = config.get('imap_server', 'outlook.office365.com')
+    port = config.get('imap_port', 993)
+    mail = CompressingIMAP4_SSL(server, port, transfer=transfer)
+    mail.login(config.get('email', 'kbaker@onwasa.com'), config.get('imap_password', ''))
+    if config.get('imap_compress', True):
+        mail.compress()
+    return mail
+
 
 def get_config():
     """Load configuration"""
@@ -25,8 +140,6 @@ def connect_imap():
     
     # For Office 365/Exchange
     imap_server = config.get('imap_server', 'outlook.office365.com')
-    imap_port = config.get('imap_port', 993)
-    email_addr = config.get('email', 'kbaker@onwasa.com')
     password = config.get('imap_password', '')
     
     if not password:
@@ -37,21 +150,282 @@ def connect_imap():
     
     try:
         # Connect to server
-        mail = imaplib.IMAP4_SSL(imap_server, imap_port)
-        mail.login(email_addr, password)
-        print(f"✅ Connected to {imap_server}")
+        mail = open_imap(config)
+        print(f"✅ Connected to {imap_server}"
+              + (" (compressed)" if mail.compressor is not None else ""))
         return mail
     except Exception as e:
         print(f"❌ Connection failed: {e}")
         return None
 
 
+def imap_quote(value):
+    """Quote a string for an IMAP command"""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def blocked_lists(config):
+    """(addresses, domains) on the block list, lowercased"""
+    addresses = set()
+    for sender in config.get('blocked_senders', []):
+        address = parse_sender(sender)[1] or sender.strip().lower()
+        if address:
+            addresses.add(address)
+    domains = {d.strip().lower().lstrip('@') for d in config.get('blocked_domains', []) if d.strip()}
+    return addresses, domains
+
+
+def exclusion_searches(config, limit=SEARCH_CRITERIA_LIMIT):
+    """UNSEEN searches that skip blocked senders and domains on the server
+    
+    One search per chunk of NOT FROM criteria; a message passes if every
+    search returns it. FROM is a substring match, so these also skip some
+    mail that is not blocked (see search_unseen).
+    """
+    addresses, domains = blocked_lists(config)
+    # Only ASCII works without CHARSET; the rest is still filtered client-side
+    patterns = sorted(p for p in addresses | {'@' + d for d in domains} if p.isascii())
+    
+    searches = []
+    criteria = []
+    size = 0
+    for pattern in patterns:
+        criterion = f"NOT FROM {imap_quote(pattern)}"
+        if criteria and size + len(criterion) > limit:
+            searches.append('UNSEEN ' + ' '.join(criteria))
+            criteria, size = [], 0
+        criteria.append(criterion)
+        size += len(criterion) + 1
+    searches.append(' '.join(['UNSEEN'] + criteria))
+    return searches
+
+
+def search_unseen(run_search, fetch_senders, config):
+    """Unseen message ids (bytes), without mail from blocked senders
+    
+    The server can only match FROM as a substring: NOT FROM "al@example.com"
+    also skips hal@example.com, and NOT FROM "@example.com" skips
+    example.com.au. So what the exclusion searches leave out is re-checked:
+    only the From header of those messages is fetched, and a message is
+    dropped only if its address, or its domain exactly (not a subdomain),
+    is blocked.
+    
+    run_search(criteria) sends one SEARCH and returns (status, data);
+    fetch_senders(ids) returns {id: From header}.
+    """
+    searches = exclusion_searches(config)
+    if searches != ['UNSEEN']:
+        # Everything unseen first, to tell what the exclusions left out
+        searches = ['UNSEEN'] + searches
+    unseen = None
+    passed = None
+    for criteria in searches:
+        status, data = run_search(criteria)
+        if status != 'OK':
+            return []
+        found = data[0].split() if data and data[0] else []
+        if unseen is None:
+            unseen, passed = found, set(found)
+        else:
+            passed.intersection_update(found)
+        if not unseen:
+            return []
+    
+    candidates = [msg_id for msg_id in unseen if msg_id not in passed]
+    if candidates:
+        addresses, domains = blocked_lists(config)
+        senders = fetch_senders(candidates)
+        for msg_id in candidates:
+            _, address, domain = parse_sender(senders.get(msg_id, ''))
+            # Unreadable ones are kept; the header stage drops them if blocked
+            if msg_id not in senders or (address not in addresses and domain not in domains):
+                passed.add(msg_id)
+    return [msg_id for msg_id in unseen if msg_id in passed]
+
+
+def fetch_senders(run_fetch, ids, by_uid=True):
+    """{id: From header} of messages (bytes ids), fetching nothing else
+    
+    run_fetch(id_set, items) sends one FETCH, or UID FETCH if by_uid, and
+    returns (status, data).
+    """
+    id_pattern = rb'UID (\d+)' if by_uid else rb'^(\d+) '
+    senders = {}
+    for chunk in chunked(ids):
+        status, data = run_fetch(b','.join(chunk).decode(), f'(UID {SENDER_ITEM})')
+        if status != 'OK':
+            continue
+        for part in data:
+            if isinstance(part, tuple):
+                match = re.search(id_pattern, part[0])
+                if match:
+                    senders[match.group(1)] = header_fields(email.message_from_bytes(part[1]))['from']
+    return senders
+
+
+def chunked(ids, size=UID_CHUNK):
+    """Split a list of UIDs into command-sized chunks"""
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+class ImapBackend(MailBackend):
+    """IMAP mail backend (UID based, headers fetched without bodies)"""
+    
+    capabilities = frozenset({HEADER_FETCH, BATCH_FLAGS, SERVER_SEARCH})
+    
+    def __init__(self, config, folder='INBOX'):
+        self.config = config
+        self.folder = folder
+        self.mail = None
+        self.limiter = get_limiter(config)
+        # Kept across reconnects
+        self.transfer = new_transfer_stats()
+        self.account = config.get('email', 'kbaker@onwasa.com').lower()
+        self.uidvalidity = None
+        max_bytes = config.get('message_cache_bytes', DEFAULT_MAX_BYTES)
+        self.cache = MessageCache(max_bytes=max_bytes) if max_bytes else None
+    
+    def command(self, op_class, *args):
+        """Run one UID command, paced and retried by the account rate limiter"""
+        return self.limiter.call(op_class, lambda: check_imap_response(*self.mail.uid(*args)))
+    
+    def connect(self):
+        """Log in and select the folder"""
+        if self.mail is not None:
+            return True
+        mail = open_imap(self.config, self.transfer)
+        status, _ = mail.select(self.folder)
+        if status != 'OK':
+            mail.logout()
+            raise imaplib.IMAP4.error(f"Could not select {self.folder}")
+        _, data = mail.response('UIDVALIDITY')
+        self.uidvalidity = data[0].decode() if data and data[0] else ''
+        if self.cache:
+            self.cache.drop_stale(self.account, self.folder, self.uidvalidity)
+        self.mail = mail
+        return True
+    
+    def close(self):
+        if self.mail is not None:
+            try:
+                self.mail.close()
+                self.mail.logout()
+            except imaplib.IMAP4.error:
+                pass
+            self.mail = None
+    
+    def list_new(self):
+        self.connect()
+        # Blocked senders are found by the server; of their mail only From is fetched
+        uids = search_unseen(
+            lambda criteria: self.command('search', 'SEARCH', None, criteria),
+            lambda ids: fetch_senders(lambda id_set, items: self.command('fetch', 'FETCH', id_set, items), ids),
+            self.config
+        )
+        return [uid.decode() for uid in uids]
+    
+    def fetch_headers(self, ids):
+        self.connect()
+        results = {}
+        for uid, raw in self._cached_fetch(ids, HEADER_ITEM, 'header_fields'):
+            results[uid] = header_fields(email.message_from_bytes(raw))
+        return results
+    
+    def fetch_body(self, msg_id, start=0, length=None):
+        self.connect()
+        for _, raw in self._cached_fetch([msg_id], 'BODY.PEEK[]', 'message'):
+            body = plain_text_body(raw)
+            return body[start:start + length] if length is not None else body[start:]
+        return ''
+    
+    def fetch_new(self, keep=None, body_length=None, needs_body=None):
+        """Headers for every new message, then one batched fetch of the kept ones
+        
+        Messages needs_body rejects are returned from their headers alone.
+        Bodies are fetched in the priority order keep assigned.
+        """
+        ids = self.list_new()
+        if not ids:
+            return []
+        headers = self.fetch_headers(ids)
+        kept = [uid for uid in ids if uid in headers and (not keep or keep(headers[uid]))]
+        full = [uid for uid in kept if not needs_body or needs_body(headers[uid])]
+        full.sort(key=lambda uid: headers[uid].get('priority', 0))
+        records = {
+            uid: MessageRecord(uid, memoryview(raw), body_length)
+            for uid, raw in self._cached_fetch(full, 'BODY.PEEK[]', 'message')
+        }
+        emails = []
+        for uid in kept:
+            if uid in records:
+                record = records[uid]
+                # Carry over what the header stage set (header_verdict, priority)
+                for key, value in headers[uid].items():
+                    if key not in record:
+                        record[key] = value
+                emails.append(record)
+            elif uid not in full:
+                emails.append(MessageRecord.from_dict({**headers[uid], 'id': uid}))
+        return emails
+    
+    def mark_read(self, ids):
+        if ids:
+            self.connect()
+            for chunk in chunked(ids):
+                self.command('store', 'STORE', ','.join(chunk), '+FLAGS', '(\\Seen)')
+    
+    def move(self, ids, folder):
+        if not ids:
+            return
+        self.connect()
+        for chunk in chunked(ids):
+            uid_set = ','.join(chunk)
+            if 'MOVE' in self.mail.capabilities:
+                self.command('store', 'MOVE', uid_set, folder)
+                continue
+            self.command('store', 'COPY', uid_set, folder)
+            self.command('store', 'STORE', uid_set, '+FLAGS', '(\\Deleted)')
+        if 'MOVE' not in self.mail.capabilities:
+            self.limiter.call('store', self.mail.expunge)
+    
+    def _cached_fetch(self, ids, item, part):
+        """Like _fetch, but served from the message cache where possible"""
+        if self.cache is None:
+            yield from self._fetch(ids, item)
+            return
+        missing = []
+        for uid in ids:
+            raw = self.cache.get(self.account, self.folder, self.uidvalidity, uid, part)
+            if raw is None:
+                missing.append(uid)
+            else:
+                yield uid, raw
+        for uid, raw in self._fetch(missing, item):
+            self.cache.put(self.account, self.folder, self.uidvalidity, uid, part, raw)
+            yield uid, raw
+    
+    def _fetch(self, ids, item):
+        """One UID FETCH for many messages; yields (uid, literal bytes)"""
+        for chunk in chunked(ids):
+            status, data = self.command('fetch', 'FETCH', ','.join(chunk), f'(UID {item})')
+            if status != 'OK':
+                continue
+            for part in data:
+                if isinstance(part, tuple):
+                    match = re.search(rb'UID (\d+)', part[0])
+                    if match:
+                        yield match.group(1).decode(), part[1]
+
+
 def check_unread():
     """Check for unread emails"""
     mail = connect_imap()
     if not mail:
         return []
     
+    # Shared with every other connection to this account; throttled
+    # commands are retried here instead of abandoning the whole check
+    limiter = get_limiter(get_config())
     emails = []
     
     try:
@@ -62,20 +436,22 @@ def check_unread():
             print("Could not access inbox")
             return []
         
-        # Search for unread emails
-        status, data = mail.search(None, 'UNSEEN')
-        
-        if status != 'OK':
-            print("No unread emails")
-            return []
-        
-        # Get email IDs
-        email_ids = data[0].split()
+        # Search for unread emails, leaving out blocked senders on the server
+        email_ids = search_unseen(
+            lambda criteria: limiter.call('search', lambda: check_imap_response(*mail.search(None, criteria))),
+            lambda ids: fetch_senders(
+                lambda id_set, items: limiter.call('fetch', lambda: check_imap_response(*mail.fetch(id_set, items))),
+                ids, by_uid=False
+            ),
+            get_config()
+        )
         
         print(f"📧 Found {len(email_ids)} unread email(s)")
         
         for e_id in email_ids:
-            status, msg_data = mail.fetch(e_id, '(RFC822)')
+            status, msg_data = limiter.call(
+                'fetch', lambda: check_imap_response(*mail.fetch(e_id, '(RFC822)'))
+            )
             
             if status != 'OK':
                 continue
@@ -112,7 +488,10 @@ def check_unread():
                 'id': e_id.decode(),
                 'from': from_addr,
                 'subject': subject,
-                'body': body[:500]  # First 500 chars
+                'body': body[:500],  # First 500 chars
+                'message_id': msg.get('Message-ID', ''),
+                'in_reply_to': msg.get('In-Reply-To', ''),
+                'references': msg.get('References', '')
             }
             
             emails.append(email_data)
@@ -8,19 +8,50 @@ import json
 import os
 from pathlib import Path
 
+from graph_backend import GRAPH_URL, GraphBackend, GraphError
+from rate_limiter import get_limiter
+from token_manager import TokenManager
+
 # Token cache location
 TOKEN_CACHE = Path.home() / '.email_assistant' / 'oauth_token.json'
 
+
+def get_config():
+    """Load configuration"""
+    config_path = Path.home() / '.email_assistant_config.json'
+    if config_path.exists():
+        with open(config_path) as f:
+            return json.load(f)
+    return {}
+
+
+_token_manager = None
+
+
+def get_token_manager():
+    """Shared token manager, refreshing in the background once started"""
+    global _token_manager
+    if _token_manager is None:
+        _token_manager = TokenManager(get_config(), cache_path=TOKEN_CACHE)
+    return _token_manager
+
+
 def get_oauth_token():
     """Get or refresh OAuth token"""
     
     # Check if we have a cached token
-    if TOKEN_CACHE.exists():
-        with open(TOKEN_CACHE) as f:
-            token_data = json.load(f)
-        
-        # TODO: Check if token is expired and refresh
-        print("✅ Using cached login (already signed in)")
+    manager = get_token_manager()
+    token_data = manager.load()
+    if token_data:
+        # Keep the token fresh from here on, off the fetch path
+        manager.start()
+        if manager.seconds_left() <= 0:
+            print("🔄 Cached login expired - refreshing")
+            if manager.get_access_token() is None:
+                print(f"❌ Refresh failed: {manager.last_error}")
+                return None
+        else:
+            print("✅ Using cached login (already signed in)")
         return token_data
     
     print("="*60)
@@ -44,21 +75,38 @@ def get_oauth_token():
     return None
 
 
-def check_emails_oauth():
-    """Check emails using OAuth"""
+def check_emails_oauth(handle=None):
+    """Check emails using OAuth
+    
+    handle(emails), if given, is called before the delta position is saved,
+    so mail it fails on is fetched again next time. Without it the emails
+    count as handled once they are returned.
+    """
     
     token = get_oauth_token()
     if not token:
         print("❌ Not signed in yet")
         return []
     
-    # TODO: Use Microsoft Graph API to fetch emails
     print("🔄 Fetching emails via Microsoft Graph API...")
     
-    # This would use the Graph API:
-    # GET https://graph.microsoft.com/v1.0/me/messages?$filter=isRead eq false
+    config = get_config()
+    backend = GraphBackend(
+        get_token_manager().get_access_token,
+        base_url=config.get('graph_url', GRAPH_URL),
+        limiter=get_limiter(config)
+    )
+    try:
+        emails = backend.check_unread()
+    except (GraphError, OSError) as e:
+        print(f"❌ Graph request failed: {e}")
+        return []
     
-    return []
+    print(f"📧 Found {len(emails)} new unread email(s)")
+    if handle is not None:
+        handle(emails)
+    backend.commit()
+    return emails
 
 
 if __name__ == '__main__':
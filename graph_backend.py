@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Microsoft Graph Backend - Incremental inbox sync over the Graph API
+
+Uses the inbox delta query so each poll only returns what changed since the
+last one, asks for just the fields the assistant scores on ($select), and
+sends mark-read / move operations in JSON $batch requests of up to 20.
+"""
+
+import json
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from mail_backend import BATCH_FLAGS, INCREMENTAL, MailBackend
+from message_record import MessageRecord
+from rate_limiter import BASE_BACKOFF, MAX_RETRIES
+
+
+GRAPH_URL = 'https://graph.microsoft.com/v1.0'
+DELTA_STATE = Path.home() / '.email_assistant' / 'graph_delta.json'
+
+# Only what is_spam_email / parse_task / threading look at
+SELECT_FIELDS = [
+    'id', 'subject', 'from', 'toRecipients', 'ccRecipients', 'body', 'bodyPreview', 'receivedDateTime', 'isRead',
+    'internetMessageId', 'conversationId'
+]
+BATCH_LIMIT = 20
+# Sub-request statuses that mean "slow down and send it again"
+THROTTLE_STATUSES = (429, 503)
+
+
+class GraphError(Exception):
+    """Error response from the Graph API"""
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(f"Graph API error {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def retry_after(response):
+    """Seconds a throttled $batch sub-response asks us to wait"""
+    headers = {k.lower(): str(v) for k, v in (response.get('headers') or {}).items()}
+    value = headers.get('retry-after', '')
+    return float(value) if value.isdigit() else BASE_BACKOFF
+
+
+class GraphBackend(MailBackend):
+    """Delta-query mail backend for Microsoft Graph"""
+
+    capabilities = frozenset({INCREMENTAL, BATCH_FLAGS})
+
+    def __init__(self, access_token, base_url=GRAPH_URL, state_path=None, timeout=30, limiter=None):
+        # access_token may be a string or a callable returning the current token
+        self.access_token = access_token
+        self.limiter = limiter
+        self.base_url = base_url.rstrip('/')
+        self.state_path = Path(state_path) if state_path else DELTA_STATE
+        self.timeout = timeout
+        self.pending_ops = []
+        self.messages = {}
+        # deltaLink of the last fetch, saved by commit() once its batch is handled
+        self.pending_delta_link = None
+
+    def request(self, method, url, body=None):
+        """Send one request and return the decoded JSON response
+
+        With a rate limiter, requests are paced and throttled ones (429/503)
+        retried on their own, so paging and batches resume where they stopped.
+        """
+        if self.limiter is not None:
+            return self.limiter.call('graph', self._send, method, url, body)
+        return self._send(method, url, body)
+
+    def _send(self, method, url, body=None):
+        if not url.startswith('http'):
+            url = self.base_url + url
+        data = json.dumps(body).encode() if body is not None else None
+        token = self.access_token() if callable(self.access_token) else self.access_token
+        if not token:
+            raise GraphError(401, "no valid access token - sign in again")
+        req = urllib.request.Request(url, data=data, method=method)
+        req.add_header('Authorization', f"Bearer {token}")
+        req.add_header('Accept', 'application/json')
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        # Plain-text bodies are all the classifiers need
+        req.add_header('Prefer', 'outlook.body-content-type="text"')
+
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                raw = resp.read()
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get('Retry-After') if e.headers else None
+            raise GraphError(
+                e.code, e.read().decode(errors='replace'),
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+            ) from e
+        return json.loads(raw) if raw else {}
+
+    def load_delta_link(self):
+        """Get the saved deltaLink from the last completed sync"""
+        if self.state_path.exists():
+            with open(self.state_path) as f:
+                return json.load(f).get('delta_link')
+        return None
+
+    def save_delta_link(self, delta_link):
+        """Persist the deltaLink for the next poll"""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'delta_link': delta_link}, f)
+        tmp_path.replace(self.state_path)
+
+    def fetch_changes(self):
+        """Get messages added or changed since the last committed poll"""
+        url = self.load_delta_link()
+        if not url:
+            url = f"/me/mailFolders/inbox/messages/delta?$select={','.join(SELECT_FIELDS)}"
+
+        changes = []
+        self.pending_delta_link = None
+        while url:
+            page = self.request('GET', url)
+            changes.extend(page.get('value', []))
+            url = page.get('@odata.nextLink')
+            if not url:
+                self.pending_delta_link = page.get('@odata.deltaLink')
+        return changes
+
+    def commit(self):
+        """Save the deltaLink of the handled batch, so the next poll starts after it"""
+        if self.pending_delta_link:
+            self.save_delta_link(self.pending_delta_link)
+            self.pending_delta_link = None
+
+    def check_unread(self):
+        """Get new unread messages as email dicts"""
+        emails = []
+        for message in self.fetch_changes():
+            if '@removed' in message or message.get('isRead'):
+                continue
+            emails.append(self.to_email_data(message))
+        return emails
+
+    def to_email_data(self, message):
+        """Convert a Graph message into the assistant's email dict"""
+        sender = (message.get('from') or {}).get('emailAddress', {})
+
+        def addresses(field):
+            return ', '.join(r.get('emailAddress', {}).get('address', '') for r in message.get(field) or [])
+
+        body = (message.get('body') or {}).get('content') or message.get('bodyPreview', '')
+        return {
+            'id': message.get('id', ''),
+            'from': sender.get('address', ''),
+            'to': addresses('toRecipients'),
+            'cc': addresses('ccRecipients'),
+            'sender_name': sender.get('name', ''),
+            'subject': message.get('subject') or '',
+            'body': body,
+            'date': message.get('receivedDateTime', ''),
+            'message_id': message.get('internetMessageId', ''),
+            'conversation_id': message.get('conversationId', '')
+        }
+
+    def list_new(self):
+        """Ids of new unread messages (one delta poll)"""
+        self.messages = {e['id']: e for e in self.check_unread()}
+        return list(self.messages)
+
+    def fetch_headers(self, ids):
+        # Delta pages already carry the selected fields, so no extra round trip
+        return {
+            msg_id: {k: v for k, v in self.messages[msg_id].items() if k not in ('id', 'body')}
+            for msg_id in ids if msg_id in self.messages
+        }
+
+    def fetch_body(self, msg_id, start=0, length=None):
+        body = self.messages.get(msg_id, {}).get('body', '')
+        return body[start:start + length] if length is not None else body[start:]
+
+    def fetch_new(self, keep=None, body_length=None, needs_body=None):
+        # Bodies come inline with the delta pages, so needs_body saves nothing here
+        emails = [MessageRecord.from_dict(e) for e in self.check_unread() if not keep or keep(e)]
+        if body_length is not None:
+            for email_data in emails:
+                email_data['body'] = email_data['body'][:body_length]
+        return emails
+
+    def mark_read(self, ids):
+        """Mark messages read, batched"""
+        for message_id in ids:
+            self.queue('PATCH', f"/me/messages/{message_id}", {'isRead': True})
+        return self.flush()
+
+    def move(self, ids, folder):
+        """Move messages to a folder (id or well-known name like 'junkemail'), batched"""
+        for message_id in ids:
+            self.queue('POST', f"/me/messages/{message_id}/move", {'destinationId': folder})
+        return self.flush()
+
+    def queue(self, method, url, body):
+        """Queue an operation for the next $batch request"""
+        self.pending_ops.append({
+            'method': method,
+            'url': url,
+            'body': body,
+            'headers': {'Content-Type': 'application/json'}
+        })
+
+    def flush(self):
+        """Send every queued operation, BATCH_LIMIT per $batch request
+
+        A $batch answers 200 even when some of its operations were throttled,
+        so each sub-response is checked: 429/503 ones are queued again and
+        sent after their Retry-After. An operation still throttled after
+        MAX_RETRIES resends is returned with its throttled response.
+        """
+        results = []
+        resends = {}
+        while self.pending_ops:
+            chunk, self.pending_ops = self.pending_ops[:BATCH_LIMIT], self.pending_ops[BATCH_LIMIT:]
+            requests = [{**op, 'id': str(i)} for i, op in enumerate(chunk)]
+            response = self.request('POST', '/$batch', {'requests': requests})
+            throttled = []
+            delay = 0
+            for sub in response.get('responses', []):
+                op = chunk[int(sub['id'])]
+                if sub.get('status') in THROTTLE_STATUSES and resends.get(id(op), 0) < MAX_RETRIES:
+                    resends[id(op)] = resends.get(id(op), 0) + 1
+                    throttled.append(op)
+                    delay = max(delay, retry_after(sub))
+                else:
+                    results.append(sub)
+            if throttled:
+                self.pending_ops = throttled + self.pending_ops
+                # The limiter pauses the whole account, not just this flush
+                if self.limiter is not None:
+                    self.limiter.throttled(delay)
+                else:
+                    time.sleep(delay)
+        return results
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Header Classifier - Decides what it can before any body is downloaded
+
+Runs on the header fields alone and returns a verdict when the headers
+are conclusive:
+
+    'blocked'  sender or domain is on the block list (dropped, never fetched)
+    'spam'     Authentication-Results shows a DMARC failure, or SPF and DKIM both fail
+    'ham'      sender's domain (or a parent domain) is whitelisted; body still fetched for tasks
+    'auto'     Auto-Submitted auto-reply / notification (no task, no body)
+    'bulk'     mailing list or bulk mail (List-Id, List-Unsubscribe, Precedence)
+    None       ambiguous: the body is needed
+
+None and 'ham' messages have their bodies fetched. So does 'bulk' mail,
+since tasks also arrive through internal lists, unless 'bulk_is_spam' is
+set, in which case bulk mail is treated as spam on its headers alone.
+"""
+
+import re
+
+from message_record import parse_sender
+from spam_rules import domain_whitelisted, whitelist_set
+
+
+BODY_VERDICTS = (None, 'ham')
+BULK_PRECEDENCE = ('bulk', 'list', 'junk')
+AUTH_RESULT = re.compile(r'\b(spf|dkim|dmarc)\s*=\s*(\w+)', re.IGNORECASE)
+
+
+def auth_results(value):
+    """{'spf': 'pass', 'dkim': 'fail', ...} from an Authentication-Results header"""
+    results = {}
+    for method, result in AUTH_RESULT.findall(value or ''):
+        results.setdefault(method.lower(), result.lower())
+    return results
+
+
+def needs_body(verdict, config):
+    """True if a message with this header-stage verdict needs its body"""
+    return verdict in BODY_VERDICTS or (verdict == 'bulk' and not config.get('bulk_is_spam'))
+
+
+def classify_headers(email_data, config):
+    """Header-stage verdict for a message (None if the body is needed)"""
+    sender = email_data.get('from', '')
+    _, _, domain = parse_sender(sender)
+
+    blocked_domains = {d.lower().lstrip('@') for d in config.get('blocked_domains', [])}
+    if sender in config.get('blocked_senders', []) or domain in blocked_domains:
+        return 'blocked'
+
+    auth = auth_results(email_data.get('authentication_results'))
+    if auth.get('dmarc') == 'fail' or (auth.get('spf') == 'fail' and auth.get('dkim') in ('fail', 'none')):
+        return 'spam'
+
+    if domain_whitelisted(domain, whitelist_set(config.get('whitelist_domains', []))):
+        return 'ham'
+
+    auto_submitted = (email_data.get('auto_submitted') or '').strip().lower()
+    if auto_submitted and auto_submitted != 'no':
+        return 'auto'
+
+    precedence = (email_data.get('precedence') or '').strip().lower()
+    if precedence in BULK_PRECEDENCE or email_data.get('list_id') or email_data.get('list_unsubscribe'):
+        return 'bulk'
+    return None
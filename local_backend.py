@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Local Mail Backend - Maildir and mbox sources
+
+Runs the whole pipeline at disk speed for offline replays and tests.
+Files are memory-mapped; header scanning only touches the header bytes of
+each message, and bodies are sliced out of the mapping on demand.
+"""
+
+import json
+import mmap
+import os
+from email.parser import BytesHeaderParser
+from pathlib import Path
+
+from mail_backend import (
+    BATCH_FLAGS, BODY_RANGE, HEADER_FETCH, ZERO_COPY,
+    MailBackend, header_fields, plain_text_body
+)
+from message_record import MessageRecord
+
+
+def map_file(path):
+    """Memory-map a file read-only (None for empty files)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def close_mapping(buf):
+    """Close a mapping unless records still hold views into it"""
+    try:
+        buf.close()
+    except BufferError:
+        # Released once the last MessageRecord over it is gone
+        pass
+
+
+def header_end(buf, start, end):
+    """Offset just past the blank line that ends a message's headers"""
+    for sep in (b'\n\n', b'\r\n\r\n'):
+        pos = buf.find(sep, start, end)
+        if pos != -1:
+            return pos + len(sep)
+    return end
+
+
+def iter_mbox_offsets(buf):
+    """Yield (start, end) of every message in a mapped mbox, found with bytes.find"""
+    if buf is None:
+        return
+    start = 0 if buf[:5] == b'From ' else None
+    pos = buf.find(b'\nFrom ')
+    while pos != -1:
+        if start is not None:
+            yield start, pos + 1
+        start = pos + 1
+        pos = buf.find(b'\nFrom ', start)
+    if start is not None:
+        yield start, len(buf)
+
+
+def mbox_offsets(buf):
+    """(start, end) of every message in a mapped mbox"""
+    return list(iter_mbox_offsets(buf))
+
+
+class LocalMailBackend(MailBackend):
+    """Maildir directory or mbox file as a mail backend"""
+
+    capabilities = frozenset({HEADER_FETCH, BODY_RANGE, BATCH_FLAGS, ZERO_COPY})
+
+    def __init__(self, path):
+        self.path = Path(path).expanduser()
+        self.is_maildir = self.path.is_dir()
+        self.header_parser = BytesHeaderParser()
+        self.buf = None
+        self.offsets = {}
+        self.seen = set()
+
+    def connect(self):
+        """Map the mbox (Maildir files are mapped per message)"""
+        if not self.is_maildir:
+            self.buf = map_file(self.path)
+            self.offsets = {str(start): (start, end) for start, end in mbox_offsets(self.buf)}
+            self.seen = self._load_seen()
+        return True
+
+    def close(self):
+        if self.buf is not None:
+            close_mapping(self.buf)
+            self.buf = None
+
+    def list_new(self):
+        """Maildir: files in new/ or unseen in cur/; mbox: not yet marked read"""
+        if self.is_maildir:
+            ids = sorted(f"new/{p.name}" for p in (self.path / 'new').glob('*') if p.is_file())
+            ids += sorted(
+                f"cur/{p.name}" for p in (self.path / 'cur').glob('*')
+                if p.is_file() and 'S' not in p.name.partition(':2,')[2]
+            )
+            return ids
+        if self.buf is None:
+            self.connect()
+        return [msg_id for msg_id in self.offsets if msg_id not in self.seen]
+
+    def message_view(self, msg_id):
+        """(buffer, start, end) of a message without copying it"""
+        if self.is_maildir:
+            buf = map_file(self.path / msg_id)
+            return buf, 0, len(buf) if buf is not None else 0
+        start, end = self.offsets[msg_id]
+        # Skip the mbox "From " separator line
+        start = self.buf.find(b'\n', start, end) + 1
+        return self.buf, start, end
+
+    def fetch_headers(self, ids):
+        results = {}
+        for msg_id in ids:
+            buf, start, end = self.message_view(msg_id)
+            if buf is None:
+                continue
+            headers = self.header_parser.parsebytes(buf[start:header_end(buf, start, end)])
+            results[msg_id] = header_fields(headers)
+            if self.is_maildir:
+                buf.close()
+        return results
+
+    def fetch_body(self, msg_id, start=0, length=None):
+        buf, msg_start, msg_end = self.message_view(msg_id)
+        if buf is None:
+            return ''
+        body = plain_text_body(memoryview(buf)[msg_start:msg_end])
+        if self.is_maildir:
+            buf.close()
+        return body[start:start + length] if length is not None else body[start:]
+
+    def fetch_new(self, keep=None, body_length=None, needs_body=None):
+        """New messages as MessageRecords over the mapped bytes, decoded on first read"""
+        emails = []
+        for msg_id in self.list_new():
+            buf, start, end = self.message_view(msg_id)
+            if buf is None:
+                continue
+            if self.is_maildir:
+                # One small file per message; copy it so the mapping can be closed
+                raw = memoryview(buf[start:end])
+                buf.close()
+            else:
+                raw = memoryview(self.buf)[start:end]
+            record = MessageRecord(msg_id, raw, body_length)
+            if keep and not keep(record):
+                continue
+            if needs_body and not needs_body(record):
+                record['body'] = ''
+            emails.append(record)
+        return emails
+
+    def mark_read(self, ids):
+        if self.is_maildir:
+            for msg_id in ids:
+                self._rename(msg_id, self.path)
+            return
+        self.seen.update(ids)
+        self._save_seen()
+
+    def move(self, ids, folder):
+        if self.is_maildir:
+            target = self.path / f".{folder}"
+            for sub in ('new', 'cur', 'tmp'):
+                (target / sub).mkdir(parents=True, exist_ok=True)
+            for msg_id in ids:
+                self._rename(msg_id, target)
+            return
+        target = self.path.with_name(f"{self.path.name}.{folder}")
+        with open(target, 'ab') as f:
+            for msg_id in ids:
+                start, end = self.offsets[msg_id]
+                f.write(self.buf[start:end])
+        self.mark_read(ids)
+
+    def _rename(self, msg_id, maildir):
+        """Move a Maildir file into maildir/cur with the Seen flag"""
+        source = self.path / msg_id
+        name, _, flags = source.name.partition(':2,')
+        if 'S' not in flags:
+            flags = ''.join(sorted(flags + 'S'))
+        os.replace(source, maildir / 'cur' / f"{name}:2,{flags}")
+
+    def _seen_path(self):
+        return self.path.with_name(f"{self.path.name}.seen.json")
+
+    def _load_seen(self):
+        if self._seen_path().exists():
+            with open(self._seen_path()) as f:
+                return set(json.load(f))
+        return set()
+
+    def _save_seen(self):
+        tmp_path = self._seen_path().with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(sorted(self.seen), f)
+        os.replace(tmp_path, self._seen_path())
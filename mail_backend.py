@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Mail Backend - The one interface every mail source implements
+
+A backend lists new messages, fetches headers and (ranges of) bodies, and
+flags or moves messages in batches. Capability flags tell the pipeline
+which of those are cheap, so it can pick the cheapest strategy: e.g. only
+fetch bodies for messages whose headers survive filtering.
+"""
+
+import email
+import email.policy
+from email.header import decode_header, make_header
+
+
+# Capability flags
+HEADER_FETCH = 'header_fetch'      # headers can be fetched without the body
+BODY_RANGE = 'body_range'          # part of a body can be fetched
+BATCH_FLAGS = 'batch_flags'        # many messages flagged/moved in one round trip
+SERVER_SEARCH = 'server_search'    # the server can filter (e.g. IMAP SEARCH)
+INCREMENTAL = 'incremental'        # list_new only returns changes since last poll
+ZERO_COPY = 'zero_copy'            # message bytes are read straight from a mapped file
+
+# Everything header_fields reads; backends that can fetch single fields ask for just these
+HEADER_NAMES = (
+    'From', 'To', 'Cc', 'Subject', 'Date', 'Message-ID', 'In-Reply-To', 'References', 'List-Id',
+    'List-Unsubscribe', 'List-Unsubscribe-Post', 'Precedence', 'Auto-Submitted',
+    'Authentication-Results'
+)
+
+
+def decode_header_value(value):
+    """Decode an RFC 2047 header into a plain string"""
+    if not value:
+        return ''
+    try:
+        return str(make_header(decode_header(value)))
+    except (UnicodeDecodeError, LookupError):
+        return str(value)
+
+
+def header_fields(headers):
+    """Turn a header Message into the assistant's email dict fields"""
+    return {
+        'from': decode_header_value(headers.get('From', '')),
+        'to': decode_header_value(headers.get('To', '')),
+        'cc': decode_header_value(headers.get('Cc', '')),
+        'subject': decode_header_value(headers.get('Subject', '')),
+        'date': headers.get('Date', ''),
+        'message_id': headers.get('Message-ID', ''),
+        'in_reply_to': headers.get('In-Reply-To', ''),
+        'references': headers.get('References', ''),
+        'list_id': headers.get('List-Id', ''),
+        'list_unsubscribe': headers.get('List-Unsubscribe', ''),
+        'list_unsubscribe_post': headers.get('List-Unsubscribe-Post', ''),
+        'precedence': headers.get('Precedence', ''),
+        'auto_submitted': headers.get('Auto-Submitted', ''),
+        'authentication_results': headers.get('Authentication-Results', '')
+    }
+
+
+def plain_text_body(raw):
+    """Extract the text/plain body from raw message bytes"""
+    msg = email.message_from_bytes(bytes(raw))
+    parts = msg.walk() if msg.is_multipart() else [msg]
+    for part in parts:
+        if part.get_content_type() == 'text/plain':
+            payload = part.get_payload(decode=True) or b''
+            return payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+    return ''
+
+
+class MailBackend:
+    """Base class for mail backends"""
+
+    capabilities = frozenset()
+
+    def supports(self, capability):
+        """Check a capability flag"""
+        return capability in self.capabilities
+
+    def connect(self):
+        """Open the connection (no-op for backends that don't need one)"""
+        return True
+
+    def close(self):
+        """Release the connection"""
+        pass
+
+    def list_new(self):
+        """Return the ids of new (unread) messages"""
+        raise NotImplementedError
+
+    def fetch_headers(self, ids):
+        """Return {id: email dict without body} for the given ids"""
+        raise NotImplementedError
+
+    def fetch_body(self, msg_id, start=0, length=None):
+        """Return the plain-text body, or the requested character range of it"""
+        raise NotImplementedError
+
+    def mark_read(self, ids):
+        """Mark messages as read"""
+        raise NotImplementedError
+
+    def move(self, ids, folder):
+        """Move messages to another folder"""
+        raise NotImplementedError
+
+    def commit(self):
+        """Called once the last fetched batch has been handled
+
+        Backends that track a sync position advance it here, so a batch that
+        was fetched but not handled is fetched again.
+        """
+        pass
+
+    def fetch_new(self, keep=None, body_length=None, needs_body=None):
+        """Fetch new messages as email dicts.
+
+        keep is an optional header-stage filter; when the backend can fetch
+        headers on their own, bodies are only fetched for kept messages,
+        and only for those needs_body(headers) accepts (the rest get '').
+        """
+        ids = self.list_new()
+        if not ids:
+            return []
+        emails = []
+        for msg_id, email_data in self.fetch_headers(ids).items():
+            if keep and not keep(email_data):
+                continue
+            email_data['id'] = msg_id
+            if needs_body and not needs_body(email_data):
+                email_data['body'] = ''
+            else:
+                email_data['body'] = self.fetch_body(msg_id, 0, body_length)
+            emails.append(email_data)
+        return emails
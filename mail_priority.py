@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Mail Priority - Boss and VIP mail first, without starving the rest
+
+Each message gets a priority level from sender rules, the header-stage
+verdict and sender reputation (0 = VIP ... 4 = bulk/spam). The queue
+orders by level plus age: waiting aging_seconds is worth one level, so a
+newsletter that has waited long enough still comes up. Because every
+item ages at the same rate, the aged order is fixed when an item is
+queued, and a plain heap keeps push and pop at O(log n).
+"""
+
+import heapq
+import itertools
+import time
+
+from message_record import parse_sender
+
+
+VIP, TRUSTED, NORMAL, AUTOMATED, BULK = range(5)
+
+
+def priority_level(email_data, config, reputation=None):
+    """Priority level of a message (lower is handled sooner)"""
+    _, address, domain = parse_sender(email_data.get('from', ''))
+    vips = {v.lower() for v in config.get('vip_senders', [])}
+    if config.get('boss_email'):
+        vips.add(config['boss_email'].lower())
+    if address in vips or domain in vips:
+        return VIP
+
+    verdict = email_data.get('header_verdict')
+    if verdict in ('spam', 'bulk'):
+        return BULK
+    if verdict == 'auto':
+        return AUTOMATED
+    if verdict == 'ham':
+        return TRUSTED
+
+    standing = reputation.verdict(email_data.get('from', '')) if reputation else None
+    if standing == 'spam':
+        return BULK
+    if standing == 'ham':
+        return TRUSTED
+    return NORMAL
+
+
+def aged_key(level, queued_at, aging_seconds):
+    """Sort key of an item: level minus age in aging_seconds units, less the shared 'now'"""
+    return level * aging_seconds + queued_at
+
+
+class MailPriorityQueue:
+    """Priority queue with linear aging"""
+
+    def __init__(self, aging_seconds=300):
+        self.aging_seconds = aging_seconds
+        self.heap = []
+        self.counter = itertools.count()
+
+    def push(self, item, level, queued_at=None):
+        queued_at = time.time() if queued_at is None else queued_at
+        key = aged_key(level, queued_at, self.aging_seconds)
+        heapq.heappush(self.heap, (key, next(self.counter), level, queued_at, item))
+
+    def pop(self):
+        """(item, level, queued_at) of the most urgent item"""
+        _, _, level, queued_at, item = heapq.heappop(self.heap)
+        return item, level, queued_at
+
+    def __len__(self):
+        return len(self.heap)
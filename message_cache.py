@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Message Cache - Content-addressed local store of fetched message bytes
+
+Raw headers and bodies fetched from the server are kept in one SQLite
+file, so re-running the pipeline (after a crash or a rule change) parses
+them locally instead of downloading them again. Keys are
+(account, folder, UIDVALIDITY, UID, part) and point to a SHA-256 content
+hash; blobs are stored zlib-compressed, once per distinct content. Total
+blob size is held under a byte budget by evicting the least recently used.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+
+DB_PATH = Path.home() / '.email_assistant' / 'messages.db'
+# Shard workers and the coordinator share the file; a write waits this long for another's
+BUSY_TIMEOUT = 30
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class MessageCache:
+    """Size-bounded LRU cache of message bytes, keyed by server location"""
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=BUSY_TIMEOUT)
+        # Readers don't block the writer (or each other) across processes
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS location (
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uidvalidity TEXT NOT NULL,
+                uid TEXT NOT NULL,
+                part TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (account, folder, uidvalidity, uid, part)
+            );
+            CREATE INDEX IF NOT EXISTS location_hash ON location (hash);
+            CREATE TABLE IF NOT EXISTS blob (
+                hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS blob_last_used ON blob (last_used);
+        ''')
+        self.db.commit()
+        self.total_bytes = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM blob').fetchone()[0]
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, account, folder, uidvalidity, uid, part):
+        """Cached bytes for a message part, or None"""
+        with self.lock:
+            row = self.db.execute(
+                'SELECT blob.hash, blob.data FROM location JOIN blob ON blob.hash = location.hash '
+                'WHERE account = ? AND folder = ? AND uidvalidity = ? AND uid = ? AND part = ?',
+                (account, folder, str(uidvalidity), str(uid), part)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.db.execute('UPDATE blob SET last_used = ? WHERE hash = ?', (time.time(), row[0]))
+            self.db.commit()
+            self.stats['hits'] += 1
+            return zlib.decompress(row[1])
+
+    def put(self, account, folder, uidvalidity, uid, part, raw):
+        """Store bytes for a message part, evicting old blobs if over budget"""
+        if not self.max_bytes:
+            return
+        raw = bytes(raw)
+        digest = hashlib.sha256(raw).hexdigest()
+        with self.lock:
+            exists = self.db.execute('SELECT 1 FROM blob WHERE hash = ?', (digest,)).fetchone()
+            if exists:
+                self.db.execute('UPDATE blob SET last_used = ? WHERE hash = ?', (time.time(), digest))
+            else:
+                data = zlib.compress(raw)
+                self.db.execute(
+                    'INSERT INTO blob (hash, data, size, last_used) VALUES (?, ?, ?, ?)',
+                    (digest, data, len(data), time.time())
+                )
+                self.total_bytes += len(data)
+            self.db.execute(
+                'INSERT OR REPLACE INTO location VALUES (?, ?, ?, ?, ?, ?)',
+                (account, folder, str(uidvalidity), str(uid), part, digest)
+            )
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        """Drop least recently used blobs until under 90% of the budget"""
+        target = self.max_bytes * 0.9
+        rows = self.db.execute('SELECT hash, size FROM blob ORDER BY last_used').fetchall()
+        for digest, size in rows:
+            if self.total_bytes <= target:
+                break
+            self.db.execute('DELETE FROM blob WHERE hash = ?', (digest,))
+            self.db.execute('DELETE FROM location WHERE hash = ?', (digest,))
+            self.total_bytes -= size
+            self.stats['evictions'] += 1
+
+    def drop_stale(self, account, folder, uidvalidity):
+        """Forget a folder's entries from before a UIDVALIDITY change"""
+        with self.lock:
+            self.db.execute(
+                'DELETE FROM location WHERE account = ? AND folder = ? AND uidvalidity != ?',
+                (account, folder, str(uidvalidity))
+            )
+            # Blobs nothing points to any more
+            cursor = self.db.execute(
+                'SELECT hash, size FROM blob WHERE hash NOT IN (SELECT hash FROM location)'
+            )
+            for digest, size in cursor.fetchall():
+                self.db.execute('DELETE FROM blob WHERE hash = ?', (digest,))
+                self.total_bytes -= size
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Message Record - Compact, lazily decoded email records
+
+A MessageRecord holds the raw message bytes (a memoryview slice of the
+fetched or mapped buffer) and decodes headers and body only when first
+read. Sender strings and domains are interned and parseaddr results are
+cached, so a backlog of many messages from the same few senders shares one
+copy of each. Records behave like the email dicts the rest of the pipeline
+uses (get, [], in, keys, setting extra keys), and to_dict() converts back.
+The email package is imported on first decode, not with this module, so
+modules that only need parse_sender stay cheap to import.
+"""
+
+import sys
+from functools import lru_cache
+
+
+HEADER_KEYS = ('from', 'to', 'cc', 'subject', 'date', 'message_id', 'in_reply_to', 'references',
+               'list_id', 'list_unsubscribe', 'list_unsubscribe_post', 'precedence',
+               'auto_submitted', 'authentication_results')
+KEYS = ('id',) + HEADER_KEYS + ('sender_name', 'body')
+# Set by the pipeline on most messages, so slots rather than extras; a key
+# is present once its slot is assigned
+PIPELINE_KEYS = ('header_verdict', 'priority', 'fresh_body', 'fresh_offsets', 'thread_root',
+                 'thread_ids', 'thread_count', 'deferred')
+# Headers are looked for in the first 64 KB
+HEADER_SCAN = 65536
+
+
+@lru_cache(maxsize=None)
+def header_parser():
+    from email.parser import BytesHeaderParser
+
+    return BytesHeaderParser()
+
+
+@lru_cache(maxsize=8192)
+def parse_sender(value):
+    """(display name, address, domain) of a From value, interned"""
+    from email.utils import parseaddr
+
+    name, address = parseaddr(value or '')
+    address = address.lower()
+    return sys.intern(name), sys.intern(address), sys.intern(address.rpartition('@')[2])
+
+
+def header_end_offset(raw):
+    """Length of the header block (including the blank line) in raw bytes"""
+    head = bytes(raw[:HEADER_SCAN])
+    for sep in (b'\n\n', b'\r\n\r\n'):
+        pos = head.find(sep)
+        if pos != -1:
+            return pos + len(sep)
+    return len(raw)
+
+
+class MessageRecord:
+    """One email; headers and body are decoded from raw bytes on first use"""
+
+    __slots__ = ('id', 'raw', 'body_limit', '_decoded', '_from', '_to', '_cc', '_subject', '_date',
+                 '_message_id', '_in_reply_to', '_references', '_list_id', '_list_unsubscribe',
+                 '_list_unsubscribe_post', '_precedence', '_auto_submitted',
+                 '_authentication_results', '_sender_name', '_body', 'extra') + PIPELINE_KEYS
+
+    def __init__(self, msg_id, raw=None, body_limit=None):
+        self.id = msg_id
+        # memoryview/bytes of the whole message, or None for records built from fields
+        self.raw = raw
+        self.body_limit = body_limit
+        self._decoded = raw is None
+        self._from = self._to = self._cc = self._subject = self._date = ''
+        self._message_id = self._in_reply_to = self._references = ''
+        self._list_id = self._list_unsubscribe = self._list_unsubscribe_post = ''
+        self._precedence = self._auto_submitted = self._authentication_results = ''
+        self._sender_name = None
+        self._body = None if raw is not None else ''
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, email_data):
+        """Build a record from an email dict; unknown keys are kept as extras"""
+        record = cls(email_data.get('id', ''))
+        for key, value in email_data.items():
+            record[key] = value
+        return record
+
+    def _decode_headers(self):
+        if self._decoded:
+            return
+        self._decoded = True
+        from mail_backend import header_fields
+
+        headers = header_fields(header_parser().parsebytes(bytes(self.raw[:header_end_offset(self.raw)])))
+        for key in HEADER_KEYS:
+            setattr(self, '_' + key, headers[key])
+        self._from = sys.intern(self._from)
+        self._list_id = sys.intern(self._list_id)
+
+    # Sender
+
+    @property
+    def sender_name(self):
+        if self._sender_name is not None:
+            return self._sender_name
+        self._decode_headers()
+        return parse_sender(self._from)[0]
+
+    @property
+    def address(self):
+        """Lowercased sender address (interned)"""
+        self._decode_headers()
+        return parse_sender(self._from)[1]
+
+    @property
+    def domain(self):
+        """Sender domain (interned)"""
+        self._decode_headers()
+        return parse_sender(self._from)[2]
+
+    @property
+    def body(self):
+        if self._body is None:
+            from mail_backend import plain_text_body
+
+            body = plain_text_body(self.raw)
+            self._body = body[:self.body_limit] if self.body_limit is not None else body
+        return self._body
+
+    # Dict interface
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.id
+        if key == 'body':
+            return self.body
+        if key == 'sender_name':
+            return self.sender_name
+        if key in HEADER_KEYS:
+            self._decode_headers()
+            return getattr(self, '_' + key)
+        if key in PIPELINE_KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == 'id':
+            self.id = value
+        elif key == 'body':
+            self._body = value
+        elif key == 'sender_name':
+            self._sender_name = sys.intern(value or '')
+        elif key in HEADER_KEYS:
+            self._decode_headers()
+            if key == 'from':
+                value = sys.intern(value or '')
+            setattr(self, '_' + key, value)
+        elif key in PIPELINE_KEYS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        if key in PIPELINE_KEYS:
+            return hasattr(self, key)
+        return key in KEYS or bool(self.extra and key in self.extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, *default):
+        if key in PIPELINE_KEYS and hasattr(self, key):
+            value = getattr(self, key)
+            delattr(self, key)
+            return value
+        if self.extra and key in self.extra:
+            return self.extra.pop(key)
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def keys(self):
+        return (list(KEYS) + [key for key in PIPELINE_KEYS if hasattr(self, key)]
+                + list(self.extra or ()))
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        """Plain email dict (decodes everything)"""
+        return dict(self.items())
+
+    # Pickling (shard workers send records to the coordinator)
+
+    def __getstate__(self):
+        # Sent decoded and without the raw bytes, which may hold attachments
+        self._decode_headers()
+        self._body = self.body
+        state = {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+        state['raw'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"MessageRecord({self.id!r})"
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Poll Scheduler - Adaptive mail polling
+
+Polls quickly right after mail arrives (burst mode), backs off
+exponentially while the mailbox is idle, adds jitter so several instances
+don't poll in lockstep, and honours server throttling hints. Waiting is
+done on an Event, so stop() and a manual check wake it up immediately.
+"""
+
+import random
+import threading
+import time
+
+
+class PollScheduler:
+    """Decides how long to wait before the next mail check"""
+
+    def __init__(self, base_interval, min_interval=10, max_interval=600,
+                 backoff=2.0, burst_polls=3, jitter=0.1):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.backoff = backoff
+        self.burst_polls = burst_polls
+        self.jitter = jitter
+        self.interval = base_interval
+        self.burst_remaining = 0
+        self.throttled_until = 0.0
+        self.wake_event = threading.Event()
+        self.stopped = False
+        self.polls = 0
+
+    @classmethod
+    def from_config(cls, config, base_key='check_interval_seconds', scale=1):
+        """Build a scheduler from the assistant config"""
+        return cls(
+            config[base_key] * scale,
+            min_interval=config.get('min_check_interval_seconds', 10),
+            max_interval=config.get('max_check_interval_seconds', 600),
+            jitter=config.get('poll_jitter', 0.1)
+        )
+
+    def reconfigure(self, config, base_key='check_interval_seconds', scale=1):
+        """Take new intervals from an edited config, keeping burst and throttle state"""
+        fresh = self.from_config(config, base_key, scale)
+        if fresh.base_interval != self.base_interval:
+            self.interval = fresh.base_interval
+        self.base_interval = fresh.base_interval
+        self.min_interval = fresh.min_interval
+        self.max_interval = fresh.max_interval
+        self.jitter = fresh.jitter
+        self.interval = min(max(self.interval, self.min_interval), self.max_interval)
+
+    def record(self, new_messages):
+        """Adjust the interval after a check that found new_messages"""
+        self.polls += 1
+        if new_messages:
+            # Replies tend to follow mail; poll fast for a few rounds
+            self.interval = self.min_interval
+            self.burst_remaining = self.burst_polls
+        elif self.burst_remaining:
+            self.burst_remaining -= 1
+        else:
+            self.interval = min(self.max_interval, max(self.interval, self.min_interval) * self.backoff)
+
+    def throttle(self, retry_after):
+        """Server asked us to wait retry_after seconds"""
+        self.throttled_until = max(self.throttled_until, time.time() + float(retry_after))
+
+    def next_delay(self):
+        """Seconds until the next check, jittered and respecting throttling"""
+        delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(delay, self.throttled_until - time.time(), 0)
+
+    def wait(self):
+        """Sleep until the next check; returns False once stopped"""
+        if not self.stopped:
+            self.wake_event.wait(self.next_delay())
+        self.wake_event.clear()
+        return not self.stopped
+
+    def wake(self):
+        """Check now instead of waiting out the interval"""
+        self.wake_event.set()
+
+    def stop(self):
+        """Stop polling; wakes any waiter"""
+        self.stopped = True
+        self.wake_event.set()
+
+    def reset(self):
+        """Start over at the base interval (e.g. after a restart or resume)"""
+        self.stopped = False
+        self.interval = self.base_interval
+        self.burst_remaining = 0
+        self.wake_event.clear()
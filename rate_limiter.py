@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter - Account-wide pacing and throttling-aware retries
+
+Office 365 throttles clients that send too many IMAP or Graph operations.
+Every backend and connection for an account shares one AccountRateLimiter:
+a token bucket per operation class paces requests, a throttle response
+(IMAP "NO [THROTTLED]", HTTP 429/503, Retry-After) pauses the whole
+account, and retries back off with decorrelated jitter. Callers retry the
+failed step only, so a batch resumes where it stopped.
+"""
+
+import random
+import threading
+import time
+
+
+# (requests per second, burst) per operation class
+DEFAULT_RATES = {
+    'search': (1.0, 5),
+    'fetch': (5.0, 20),
+    'store': (5.0, 20),
+    'graph': (10.0, 20),
+}
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 120.0
+MAX_RETRIES = 6
+
+
+class ThrottledError(Exception):
+    """The server asked us to slow down"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def check_imap_response(typ, data):
+    """Raise ThrottledError for an IMAP 'NO [THROTTLED]' response"""
+    if typ == 'NO':
+        text = b' '.join(d for d in data if isinstance(d, bytes)).decode(errors='replace')
+        if 'THROTTLED' in text.upper():
+            raise ThrottledError(f"IMAP server throttled: {text}")
+    return typ, data
+
+
+def throttle_delay(exc):
+    """Retry-After for a throttling error, 0 if unspecified, None if not throttling"""
+    if isinstance(exc, ThrottledError):
+        return exc.retry_after or 0
+    status = getattr(exc, 'status', None)
+    if status in (429, 503):
+        return getattr(exc, 'retry_after', None) or 0
+    if 'THROTTLED' in str(exc).upper():
+        return 0
+    return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Take tokens, sleeping until they are available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class AccountRateLimiter:
+    """Token buckets plus a shared throttle pause for one account"""
+
+    def __init__(self, rates=None, max_retries=MAX_RETRIES):
+        rates = {**DEFAULT_RATES, **(rates or {})}
+        self.buckets = {op: TokenBucket(rate, burst) for op, (rate, burst) in rates.items()}
+        self.max_retries = max_retries
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.metrics = {'calls': 0, 'throttle_events': 0, 'retries': 0, 'wait_seconds': 0.0}
+
+    def acquire(self, op_class):
+        """Wait for the account to be unpaused and for a token"""
+        pause = self.paused_until - time.time()
+        if pause > 0:
+            time.sleep(pause)
+        waited = max(pause, 0)
+        bucket = self.buckets.get(op_class)
+        if bucket:
+            waited += bucket.acquire()
+        with self.lock:
+            self.metrics['calls'] += 1
+            self.metrics['wait_seconds'] += waited
+
+    def throttled(self, delay):
+        """Pause every caller on this account for delay seconds"""
+        with self.lock:
+            self.metrics['throttle_events'] += 1
+            self.paused_until = max(self.paused_until, time.time() + delay)
+
+    def call(self, op_class, func, *args, **kwargs):
+        """Run func paced by op_class, retrying throttling errors with backoff"""
+        sleep = BASE_BACKOFF
+        for attempt in range(self.max_retries + 1):
+            self.acquire(op_class)
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                retry_after = throttle_delay(e)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                # Decorrelated jitter, never sooner than the server asked for
+                sleep = min(MAX_BACKOFF, random.uniform(BASE_BACKOFF, sleep * 3))
+                self.throttled(max(sleep, retry_after))
+                with self.lock:
+                    self.metrics['retries'] += 1
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(config):
+    """The shared limiter for the configured account"""
+    account = config.get('email', '').lower()
+    with _limiters_lock:
+        if account not in _limiters:
+            rates = {op: tuple(v) for op, v in config.get('rate_limits', {}).items()}
+            _limiters[account] = AccountRateLimiter(rates)
+        return _limiters[account]
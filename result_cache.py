@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Result Cache - Remembers approved task outputs
+
+Repeat requests (weekly "send me the numbers" emails, duplicate CCs) are
+answered from here instead of going through parse/skill/execute again.
+Entries are keyed by the skill that produced them, and live in a small
+in-memory LRU backed by JSON files on disk. The disk tier is pruned of
+expired files and capped at max_disk_entries, oldest first.
+"""
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+CACHE_DIR = Path.home() / '.email_assistant' / 'cache' / 'results'
+# Skills whose output names the sender; their results are cached per sender
+SENDER_DEPENDENT = frozenset({'send_email'})
+
+
+def normalize_request(text):
+    """Normalize request text so trivial differences hash the same"""
+    text = (text or '').lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def attachment_digest(attachment):
+    """Get a stable digest for an attachment (dict, bytes or str)"""
+    if isinstance(attachment, dict):
+        if attachment.get('digest'):
+            return attachment['digest']
+        content = attachment.get('content', b'')
+    else:
+        content = attachment
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content or b'').hexdigest()
+
+
+def make_key(skill_name, extracted_request, attachments=None, sender=None):
+    """Build the cache key for a request run by a skill (per sender if sender is given)"""
+    digests = sorted(attachment_digest(a) for a in (attachments or []))
+    parts = [skill_name, normalize_request(extracted_request)] + digests
+    if sender:
+        parts.append(f"from:{sender.strip().lower()}")
+    content = '\x1f'.join(parts)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ResultCache:
+    """LRU + TTL cache of approved results with an on-disk tier"""
+
+    def __init__(self, max_entries=256, ttl_seconds=7 * 24 * 3600, cache_dir=None, max_disk_entries=4096):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else CACHE_DIR
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.disk_entries = self.prune()
+
+    def key_for(self, skill_name, task, email_data=None):
+        """Build the cache key for a parsed task run by the named skill"""
+        attachments = (email_data or {}).get('attachments', [])
+        sender = task.get('from', '') if skill_name in SENDER_DEPENDENT else None
+        return make_key(skill_name, task['extracted_request'], attachments, sender)
+
+    def get(self, key):
+        """Return a cached result, or None on a miss"""
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self.stats['disk_hits'] += 1
+                self._remember(key, entry)
+
+        if entry is None or self._expired(entry):
+            if entry is not None:
+                self._drop(key)
+            self.stats['misses'] += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return entry['result']
+
+    def put(self, key, skill_name, result):
+        """Store an approved result produced by the named skill"""
+        entry = {
+            'skill': skill_name,
+            'stored_at': time.time(),
+            'result': result
+        }
+        self._remember(key, entry)
+        self.stats['stores'] += 1
+        try:
+            with open(self.cache_dir / f"{key}.json", 'w') as f:
+                json.dump(entry, f)
+        except (OSError, TypeError):
+            return
+        self.disk_entries += 1
+        if self.disk_entries > self.max_disk_entries:
+            self.disk_entries = self.prune()
+
+    def invalidate_skill(self, skill_name):
+        """Drop every cached result produced by a skill"""
+        removed = 0
+        for key in [k for k, e in self.entries.items() if e['skill'] == skill_name]:
+            self._drop(key)
+            removed += 1
+        for path in self.cache_dir.glob('*.json'):
+            entry = self._read(path)
+            if entry and entry.get('skill') == skill_name:
+                path.unlink(missing_ok=True)
+                removed += 1
+        self.disk_entries = max(0, self.disk_entries - removed)
+        return removed
+
+    def prune(self):
+        """Delete expired files and the oldest beyond max_disk_entries; returns files kept"""
+        files = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        files.sort()
+        cutoff = time.time() - self.ttl_seconds
+        excess = len(files) - self.max_disk_entries
+        kept = 0
+        for i, (mtime, path) in enumerate(files):
+            if mtime < cutoff or i < excess:
+                path.unlink(missing_ok=True)
+                self.entries.pop(path.stem, None)
+            else:
+                kept += 1
+        return kept
+
+    def snapshot(self):
+        """{key: entry} of every unexpired result on disk"""
+        entries = {}
+        for path in self.cache_dir.glob('*.json'):
+            entry = self._read(path)
+            if entry and not self._expired(entry):
+                entries[path.stem] = entry
+        return entries
+
+    def seed(self, entries):
+        """Write entries from snapshot() to this cache's disk tier"""
+        for key, entry in entries.items():
+            with open(self.cache_dir / f"{key}.json", 'w') as f:
+                json.dump(entry, f)
+        self.disk_entries = self.prune()
+
+    def clear(self):
+        """Drop everything, memory and disk"""
+        self.entries.clear()
+        for path in self.cache_dir.glob('*.json'):
+            path.unlink(missing_ok=True)
+        self.disk_entries = 0
+
+    def hit_rate(self):
+        """Fraction of lookups answered from the cache"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _expired(self, entry):
+        return time.time() - entry['stored_at'] > self.ttl_seconds
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        (self.cache_dir / f"{key}.json").unlink(missing_ok=True)
+
+    def _load(self, key):
+        path = self.cache_dir / f"{key}.json"
+        if not path.exists():
+            return None
+        return self._read(path)
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
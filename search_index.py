@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Search Index - Full-text search over processed mail
+
+Every message the pipeline classifies is written to an SQLite FTS5 index
+(subject, sender, stripped body, verdict, task type and decision), so past
+mail can be found in milliseconds and research tasks have something to
+search. Rows are upserted by Message-ID as the pipeline runs.
+
+Queries use FTS5 syntax, e.g. 'budget report', 'sender:alice',
+'verdict:spam', '"quarterly numbers"'. Results are ranked by BM25.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from skill_index import tokenize
+
+
+DB_PATH = Path.home() / '.email_assistant' / 'search.db'
+# Shard workers and the coordinator share the file; a write waits this long for another's
+BUSY_TIMEOUT = 30
+
+# Column weights for BM25: a subject hit counts more than a body hit
+WEIGHTS = (5.0, 3.0, 1.0, 0.5, 0.5, 0.5)
+
+
+def safe_query(query):
+    """Quote every term so arbitrary user text is a valid FTS5 query"""
+    terms = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+class SearchIndex:
+    """FTS5 index of processed messages"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=BUSY_TIMEOUT)
+        # Readers don't block the writer (or each other) across processes
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS mail (
+                id INTEGER PRIMARY KEY,
+                message_key TEXT UNIQUE NOT NULL,
+                subject TEXT, sender TEXT, body TEXT,
+                verdict TEXT, task_type TEXT, decision TEXT,
+                date TEXT, indexed REAL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS mail_fts USING fts5(
+                subject, sender, body, verdict, task_type, decision,
+                content='mail', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS mail_ai AFTER INSERT ON mail BEGIN
+                INSERT INTO mail_fts (rowid, subject, sender, body, verdict, task_type, decision)
+                VALUES (new.id, new.subject, new.sender, new.body, new.verdict, new.task_type, new.decision);
+            END;
+            CREATE TRIGGER IF NOT EXISTS mail_ad AFTER DELETE ON mail BEGIN
+                INSERT INTO mail_fts (mail_fts, rowid, subject, sender, body, verdict, task_type, decision)
+                VALUES ('delete', old.id, old.subject, old.sender, old.body, old.verdict, old.task_type, old.decision);
+            END;
+            CREATE TRIGGER IF NOT EXISTS mail_au AFTER UPDATE ON mail BEGIN
+                INSERT INTO mail_fts (mail_fts, rowid, subject, sender, body, verdict, task_type, decision)
+                VALUES ('delete', old.id, old.subject, old.sender, old.body, old.verdict, old.task_type, old.decision);
+                INSERT INTO mail_fts (rowid, subject, sender, body, verdict, task_type, decision)
+                VALUES (new.id, new.subject, new.sender, new.body, new.verdict, new.task_type, new.decision);
+            END;
+        ''')
+        self.db.commit()
+
+    @staticmethod
+    def message_key(email_data):
+        """Stable key for a message: its Message-ID, else the backend id"""
+        return email_data.get('message_id') or f"id:{email_data.get('id', '')}"
+
+    def add(self, email_data, body, verdict, task_type=''):
+        """Index (or re-index) a classified message, keeping any decision already made"""
+        with self.lock:
+            self.db.execute('''
+                INSERT INTO mail (message_key, subject, sender, body, verdict, task_type, decision, date, indexed)
+                VALUES (?, ?, ?, ?, ?, ?, '', ?, ?)
+                ON CONFLICT (message_key) DO UPDATE SET
+                    subject = excluded.subject, sender = excluded.sender, body = excluded.body,
+                    verdict = excluded.verdict, task_type = excluded.task_type,
+                    date = excluded.date, indexed = excluded.indexed
+            ''', (
+                self.message_key(email_data), email_data.get('subject', ''), email_data.get('from', ''),
+                body, verdict, task_type or '', email_data.get('date', ''), time.time()
+            ))
+            self.db.commit()
+
+    def set_decision(self, email_data, decision):
+        """Record what the operator decided for a message"""
+        with self.lock:
+            self.db.execute(
+                'UPDATE mail SET decision = ? WHERE message_key = ?',
+                (decision, self.message_key(email_data))
+            )
+            self.db.commit()
+
+    def search(self, query, limit=10):
+        """Best matches as dicts with a highlighted body snippet"""
+        sql = f'''
+            SELECT mail.message_key, mail.subject, mail.sender, mail.verdict, mail.task_type,
+                   mail.decision, mail.date,
+                   snippet(mail_fts, 2, '[', ']', '…', 12),
+                   bm25(mail_fts, {', '.join(map(str, WEIGHTS))}) AS rank
+            FROM mail_fts JOIN mail ON mail.id = mail_fts.rowid
+            WHERE mail_fts MATCH ?
+            ORDER BY rank LIMIT ?
+        '''
+        with self.lock:
+            try:
+                rows = self.db.execute(sql, (query, limit)).fetchall()
+            except sqlite3.OperationalError:
+                # Not valid FTS5 syntax; search for the words instead
+                query = safe_query(query)
+                rows = self.db.execute(sql, (query, limit)).fetchall() if query else []
+        keys = ('message_id', 'subject', 'from', 'verdict', 'task_type', 'decision', 'date', 'snippet')
+        return [{**dict(zip(keys, row)), 'score': round(-row[-1], 3)} for row in rows]
+
+    def related(self, text, limit=5):
+        """Messages sharing any significant word with free text (for research tasks)"""
+        terms = dict.fromkeys(tokenize(text))
+        if not terms:
+            return []
+        return self.search(' OR '.join(f'"{term}"' for term in terms), limit)
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM mail').fetchone()[0]
+
+    def close(self):
+        self.db.close()
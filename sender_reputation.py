@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Sender Reputation - Decaying spam/ham history per sender and domain
+
+Every verdict and every operator decision adds to exponentially decaying
+spam and ham counts for the sender's address and domain (operator
+decisions count more, so one decision is enough on its own). Domain
+counts are not kept for freemail and other shared domains, where one
+sender says nothing about the next. Lookups are a dict access; once a
+sender has a strong record either way, is_spam_email trusts it and skips
+the keyword scan. Counts live in memory and are written to disk at most once a minute.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from message_record import parse_sender
+
+
+REPUTATION_PATH = Path.home() / '.email_assistant' / 'reputation.json'
+USER_WEIGHT = 5.0
+SAVE_INTERVAL = 60
+# Shared domains: judged per address only
+FREEMAIL_DOMAINS = frozenset({
+    'gmail.com', 'googlemail.com', 'outlook.com', 'hotmail.com', 'live.com', 'msn.com',
+    'yahoo.com', 'ymail.com', 'aol.com', 'icloud.com', 'me.com', 'mac.com',
+    'proton.me', 'protonmail.com', 'gmx.com', 'gmx.de', 'gmx.net', 'web.de', 'mail.com',
+    'yandex.com', 'yandex.ru', 'zoho.com', 'qq.com', '163.com', 'comcast.net'
+})
+
+
+class SenderReputation:
+    """Address and domain reputation with exponential decay"""
+
+    def __init__(self, path=None, half_life_days=30, min_evidence=3.0, confidence=0.9, autosave=True,
+                 read_only=False):
+        self.path = Path(path) if path else REPUTATION_PATH
+        # Read-only tables answer lookups but never learn or write
+        self.read_only = read_only
+        # Off in shard workers: they learn in memory and only the coordinator writes
+        self.autosave = autosave
+        # key -> [spam, ham] added since take_deltas(), when tracked (shard workers)
+        self.deltas = None
+        self.half_life = half_life_days * 86400
+        self.min_evidence = min_evidence
+        self.confidence = confidence
+        self.lock = threading.Lock()
+        # key -> [spam, ham, updated]; keys are 'addr:<address>' and 'domain:<domain>'
+        self.entries = self._load()
+        self.dirty = False
+        self.last_save = time.time()
+
+    @classmethod
+    def disabled(cls):
+        """Empty, read-only reputation: every sender is unknown"""
+        reputation = cls(read_only=True)
+        reputation.entries = {}
+        return reputation
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _decayed(self, entry, now):
+        factor = 0.5 ** ((now - entry[2]) / self.half_life)
+        return entry[0] * factor, entry[1] * factor
+
+    def keys(self, sender):
+        _, address, domain = parse_sender(sender)
+        if domain in FREEMAIL_DOMAINS:
+            domain = ''
+        return [key for key in (address and f"addr:{address}", domain and f"domain:{domain}") if key]
+
+    def record(self, sender, is_spam, weight=1.0):
+        """Add a verdict (weight 1) or an operator decision (USER_WEIGHT)"""
+        if self.read_only:
+            return
+        now = time.time()
+        with self.lock:
+            for key in self.keys(sender):
+                entry = self.entries.get(key)
+                spam, ham = self._decayed(entry, now) if entry else (0.0, 0.0)
+                if is_spam:
+                    spam += weight
+                else:
+                    ham += weight
+                self.entries[key] = [spam, ham, now]
+                if self.deltas is not None:
+                    delta = self.deltas.setdefault(key, [0.0, 0.0])
+                    delta[0 if is_spam else 1] += weight
+            self.dirty = True
+        self.maybe_save()
+
+    def take_deltas(self):
+        """What was recorded since the last call ({key: [spam, ham]}), and start tracking"""
+        with self.lock:
+            deltas, self.deltas = self.deltas or {}, {}
+        return deltas
+
+    def merge(self, deltas):
+        """Add counts recorded elsewhere (take_deltas() of a shard worker)"""
+        if self.read_only or not deltas:
+            return
+        now = time.time()
+        with self.lock:
+            for key, (spam_delta, ham_delta) in deltas.items():
+                entry = self.entries.get(key)
+                spam, ham = self._decayed(entry, now) if entry else (0.0, 0.0)
+                self.entries[key] = [spam + spam_delta, ham + ham_delta, now]
+            self.dirty = True
+        self.maybe_save()
+
+    def verdict(self, sender):
+        """'spam' or 'ham' for a sender with a strong record, else None
+
+        The address is consulted before the domain, so one good sender at a
+        spammy domain (or the reverse) is judged on their own history.
+        """
+        now = time.time()
+        for key in self.keys(sender):
+            entry = self.entries.get(key)
+            if not entry:
+                continue
+            spam, ham = self._decayed(entry, now)
+            total = spam + ham
+            if total < self.min_evidence:
+                continue
+            if spam / total >= self.confidence:
+                return 'spam'
+            if ham / total >= self.confidence:
+                return 'ham'
+            # Mixed history for the address; the domain won't know better
+            return None
+        return None
+
+    def maybe_save(self):
+        """Persist if there are changes and the last save is old enough"""
+        if self.autosave and self.dirty and time.time() - self.last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """Write the table atomically"""
+        with self.lock:
+            if self.read_only or not self.dirty:
+                return
+            snapshot = json.dumps(self.entries)
+            self.dirty = False
+            self.last_save = time.time()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(snapshot)
+        os.replace(tmp_path, self.path)
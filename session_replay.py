@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Session Replay - Record triage sessions and replay them deterministically
+
+Recording (python3 email_assistant_cli.py --local --record session.jsonl)
+captures every fetched message as raw bytes, the operator's answers and
+per-stage timings, plus the config (without passwords and OAuth
+settings), learned skills, sender reputation and result cache the session
+started from. Each message also carries the thread-index rows it was
+threaded against when fetched. Replaying feeds the same messages and
+answers back through an EmailAssistantCLI whose files all live in a
+scratch directory, via a replay backend instead of a mail server and with
+no side effects, and writes a result file. The search index is not
+recorded, so research outputs that list related mail can differ. Diffing two result files (e.g. from before and after a
+change) shows verdict changes and per-stage timing changes.
+
+Usage:
+    python3 session_replay.py replay session.jsonl [--out result.json]
+    python3 session_replay.py diff before.json after.json
+"""
+
+import argparse
+import base64
+import builtins
+import contextlib
+import io
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from mail_backend import HEADER_FETCH, MailBackend
+
+
+# Methods timed as pipeline stages
+STAGES = {
+    'collect_threads': 'threads',
+    'is_spam_email': 'spam',
+    'prepare_work': 'task',
+    'apply_spam_decision': 'decision',
+    'apply_work_decision': 'decision',
+    'apply_info_decision': 'decision'
+}
+
+
+# Config keys never written to a session file (replay needs no credentials)
+SECRET_MARKERS = ('password', 'secret', 'token')
+
+
+def public_config(config):
+    """The config without passwords, OAuth settings or anything else secret-looking"""
+    return {key: value for key, value in config.items()
+            if not key.startswith('oauth_') and not any(m in key.lower() for m in SECRET_MARKERS)}
+
+
+def message_key(email_data):
+    return email_data.get('message_id') or f"id:{email_data.get('id', '')}"
+
+
+def encode_message(email_data):
+    """Session form of a fetched message: raw bytes when we have them"""
+    raw = getattr(email_data, 'raw', None)
+    if raw is not None:
+        return {'key': message_key(email_data), 'id': email_data.get('id', ''),
+                'raw': base64.b64encode(bytes(raw)).decode()}
+    fields = {k: v for k, v in dict(email_data.items()).items() if k not in ('fresh_body', 'fresh_offsets')}
+    return {'key': message_key(email_data), 'fields': fields}
+
+
+def decode_message(entry):
+    """Inverse of encode_message"""
+    if 'raw' in entry:
+        from message_record import MessageRecord
+        return MessageRecord(entry['id'], memoryview(base64.b64decode(entry['raw'])))
+    return dict(entry['fields'])
+
+
+def instrument(assistant, emit):
+    """Wrap the assistant's stage methods to emit timing, verdict and decision events"""
+    def wrap(name, stage):
+        method = getattr(assistant, name)
+
+        def timed(*args):
+            started = time.perf_counter()
+            result = method(*args)
+            seconds = time.perf_counter() - started
+            key = message_key(args[0]) if name != 'collect_threads' else None
+            emit({'type': 'timing', 'stage': stage, 'key': key, 'seconds': seconds})
+            if name == 'is_spam_email':
+                emit({'type': 'verdict', 'key': key, 'spam': bool(result)})
+            elif name == 'prepare_work':
+                emit({'type': 'task', 'key': key, 'task_type': result['task']['type'] if result else None})
+            elif stage == 'decision':
+                emit({'type': 'decision', 'key': key, 'kind': name[len('apply_'):-len('_decision')],
+                      'choice': args[-1]})
+            return result
+        setattr(assistant, name, timed)
+
+    for name, stage in STAGES.items():
+        wrap(name, stage)
+
+
+class Recorder:
+    """Appends a live session's messages, answers and timings to a JSONL file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = None
+
+    def emit(self, event):
+        self.file.write(json.dumps(event, default=str) + '\n')
+        self.file.flush()
+
+    def attach(self, assistant):
+        """Start recording everything the assistant does from here on"""
+        self.file = open(self.path, 'w')
+        skills = {}
+        for skill_file in sorted(assistant.learned_skills_dir.glob('*.json')):
+            skills[skill_file.name] = skill_file.read_text()
+        self.emit({
+            'type': 'session', 'version': 2, 'started': datetime.now().isoformat(),
+            'config': public_config(assistant.config), 'skills': skills,
+            'reputation': assistant.reputation.entries,
+            'result_cache': assistant.result_cache.snapshot()
+        })
+
+        fetch = assistant.fetch_new_emails
+
+        def recording_fetch():
+            started = time.perf_counter()
+            emails = fetch()
+            fetch_seconds = time.perf_counter() - started
+            messages = [{**encode_message(e), 'threads': assistant.thread_index.snapshot(e)} for e in emails]
+            self.emit({'type': 'batch', 'fetch_seconds': fetch_seconds, 'messages': messages})
+            return emails
+        assistant.fetch_new_emails = recording_fetch
+        instrument(assistant, self.emit)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class ReplayBackend(MailBackend):
+    """Serves one recorded batch through the normal fetch path"""
+
+    capabilities = frozenset({HEADER_FETCH})
+
+    def __init__(self, emails):
+        self.emails = emails
+
+    def fetch_new(self, keep=None, body_length=None, needs_body=None):
+        emails = []
+        for email_data in self.emails:
+            if keep and not keep(email_data):
+                continue
+            if needs_body and not needs_body(email_data):
+                email_data['body'] = ''
+            emails.append(email_data)
+        return emails
+
+    def mark_read(self, ids):
+        pass
+
+    def move(self, ids, folder):
+        pass
+
+
+class OfflineUnsubscriber:
+    """Stands in for the unsubscribe pool during replays"""
+
+    def submit(self, email_data):
+        return None
+
+    def pending(self):
+        return 0
+
+
+def load_session(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def prepare_home(header):
+    """Scratch home directory with the session's starting state"""
+    home = Path(tempfile.mkdtemp(prefix='email_replay_'))
+    # No live backend; each recorded batch is served by a ReplayBackend
+    config = {**header['config'], 'mail_app': 'replay'}
+    with open(home / '.email_assistant_config.json', 'w') as f:
+        json.dump(config, f)
+    skills_dir = home / '.email_assistant' / 'skills'
+    skills_dir.mkdir(parents=True)
+    for name, text in header.get('skills', {}).items():
+        (skills_dir / name).write_text(text)
+    with open(home / '.email_assistant' / 'reputation.json', 'w') as f:
+        json.dump(header.get('reputation', {}), f)
+    cache_dir = home / '.email_assistant' / 'cache' / 'results'
+    cache_dir.mkdir(parents=True)
+    for key, entry in header.get('result_cache', {}).items():
+        with open(cache_dir / f"{key}.json", 'w') as f:
+            json.dump(entry, f)
+    return home
+
+
+def replay(events):
+    """Run a recorded session through the current code; returns the replay events"""
+    header = events[0]
+    home = prepare_home(header)
+    old_input = builtins.input
+    output = []
+    try:
+        from email_assistant_cli import EmailAssistantCLI
+
+        answers = defaultdict(list)
+        for event in events:
+            if event['type'] == 'decision':
+                answers[event['key']].append(event['choice'])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # All of its files in the scratch home, not the user's
+            assistant = EmailAssistantCLI(home=home)
+        assistant._unsubscriber = OfflineUnsubscriber()
+
+        current = {'key': None}
+        process = assistant.process_email_interactive
+
+        def scripted_process(email_data):
+            current['key'] = message_key(email_data)
+            return process(email_data)
+        assistant.process_email_interactive = scripted_process
+        builtins.input = lambda prompt='': answers[current['key']].pop(0) if answers[current['key']] else ''
+        instrument(assistant, output.append)
+
+        batches = [e for e in events if e['type'] == 'batch']
+        for batch in batches:
+            for message in batch['messages']:
+                assistant.thread_index.seed(message.get('threads', {}))
+            assistant.connector.backend = ReplayBackend([decode_message(m) for m in batch['messages']])
+            with contextlib.redirect_stdout(io.StringIO()):
+                assistant.check_once()
+    finally:
+        builtins.input = old_input
+        shutil.rmtree(home, ignore_errors=True)
+    return output
+
+
+def summarize(events):
+    """Per-message verdicts and per-stage timings from session or replay events"""
+    messages = defaultdict(dict)
+    timings = defaultdict(list)
+    for event in events:
+        key = event.get('key')
+        if event['type'] == 'verdict':
+            messages[key]['spam'] = event['spam']
+        elif event['type'] == 'task':
+            messages[key]['task_type'] = event['task_type']
+        elif event['type'] == 'decision':
+            messages[key]['decision'] = f"{event['kind']}:{event['choice']}"
+        elif event['type'] == 'timing':
+            timings[event['stage']].append(event['seconds'])
+    return {'messages': dict(messages), 'timings': dict(timings)}
+
+
+def diff(before, after):
+    """Print verdict and timing differences between two summaries"""
+    changed = 0
+    for key in sorted(set(before['messages']) | set(after['messages'])):
+        old = before['messages'].get(key, {})
+        new = after['messages'].get(key, {})
+        if old != new:
+            changed += 1
+            print(f"  {key}")
+            for field in sorted(set(old) | set(new)):
+                if old.get(field) != new.get(field):
+                    print(f"      {field}: {old.get(field)} -> {new.get(field)}")
+    print(f"Verdicts: {changed} of {len(after['messages'])} message(s) changed")
+    print()
+    print(f"{'Stage':<10}{'before ms':>12}{'after ms':>12}{'change':>10}   (median per call)")
+    for stage in sorted(set(before['timings']) | set(after['timings'])):
+        old = before['timings'].get(stage) or [0]
+        new = after['timings'].get(stage) or [0]
+        old_ms = statistics.median(old) * 1000
+        new_ms = statistics.median(new) * 1000
+        change = f"{(new_ms - old_ms) / old_ms:+.0%}" if old_ms else 'n/a'
+        print(f"{stage:<10}{old_ms:>12.3f}{new_ms:>12.3f}{change:>10}")
+    return changed
+
+
+def load_summary(path):
+    """A result file, or a session file summarized on the fly"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        return summarize(load_session(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded triage sessions")
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay_cmd = commands.add_parser('replay', help="Replay a session through the current code")
+    replay_cmd.add_argument('session', help="Session file from --record")
+    replay_cmd.add_argument('--out', help="Write the result here (default: print a summary)")
+    diff_cmd = commands.add_parser('diff', help="Compare two results (or sessions)")
+    diff_cmd.add_argument('before')
+    diff_cmd.add_argument('after')
+    args = parser.parse_args()
+
+    if args.command == 'diff':
+        sys.exit(1 if diff(load_summary(args.before), load_summary(args.after)) else 0)
+
+    events = load_session(args.session)
+    started = time.perf_counter()
+    result = summarize(replay(events))
+    result['seconds'] = time.perf_counter() - started
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+    print(f"Replayed {len(result['messages'])} message(s) in {result['seconds']:.2f}s")
+    diff(summarize(events), result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Shard Coordinator - Spreads a large mailbox over worker processes
+
+One interpreter is GIL-bound on MIME parsing and scoring, so in sharded
+mode the daemon becomes a coordinator. It assigns folders to worker
+processes through a consistent-hash ring, so adding or losing a worker
+only moves that worker's share of folders. Each worker runs its own
+connectors, classifiers and poll schedule and sends classified items back
+over a multiprocessing queue; the coordinator holds the one approval
+queue, serves the usual RPC methods and applies decisions. A worker lets
+its backend move past a folder's mail only after the coordinator has
+acknowledged (and persisted) the items, and does not check that folder
+again until then. What workers learn about senders comes back with their
+stats and is merged into the coordinator's reputation table, which only
+the coordinator writes. A dead worker's
+folders go to the survivors right away, and a replacement is started
+after RESTART_DELAY.
+
+Run:    python3 email_assistant_cli.py --daemon --shards 8
+"""
+
+import bisect
+import contextlib
+import hashlib
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from assistant_daemon import AssistantDaemon
+from email_connector import EmailConnector
+
+
+RING_REPLICAS = 64
+SUPERVISE_SECONDS = 1.0
+RESTART_DELAY = 30
+# Special-use folders that never hold mail to triage
+SKIP_FLAGS = ('\\noselect', '\\nonexistent', '\\trash', '\\junk', '\\sent', '\\drafts')
+LIST_LINE = re.compile(rb'\((?P<flags>[^)]*)\) (?P<delimiter>"[^"]*"|NIL) (?P<name>.+)')
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of folder names onto workers"""
+
+    def __init__(self, replicas=RING_REPLICAS):
+        self.replicas = replicas
+        self.points = []
+        self.owners = {}
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = ring_hash(f"{node}#{i}")
+            bisect.insort(self.points, point)
+            self.owners[point] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            point = ring_hash(f"{node}#{i}")
+            if self.owners.get(point) == node:
+                del self.owners[point]
+                self.points.remove(point)
+
+    def node_for(self, key):
+        """Worker that owns a folder (None on an empty ring)"""
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, ring_hash(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+def list_folders(config):
+    """Folders to shard: 'shard_folders' if set, else whatever the mail source has"""
+    if config.get('shard_folders'):
+        return list(config['shard_folders'])
+    mail_app = config.get('mail_app', 'outlook')
+    if mail_app == 'imap':
+        from email_imap import open_imap
+
+        mail = open_imap(config)
+        try:
+            _, lines = mail.list()
+        finally:
+            mail.logout()
+        folders = []
+        for line in lines or []:
+            match = LIST_LINE.match(line or b'')
+            if match and not any(flag in match.group('flags').decode().lower() for flag in SKIP_FLAGS):
+                # Kept as listed (quoted if need be), ready for SELECT
+                folders.append(match.group('name').decode())
+        return folders
+    if mail_app in ('maildir', 'local'):
+        root = Path(config['mail_path']).expanduser()
+        folders = ['INBOX'] if (root / 'cur').is_dir() else []
+        folders += sorted(d.name for d in root.iterdir() if (d / 'cur').is_dir())
+        return folders
+    return ['INBOX']
+
+
+class ShardWorker(AssistantDaemon):
+    """Pipeline for one worker's folders; hands items over instead of holding them"""
+
+    def __init__(self, assistant):
+        super().__init__(assistant)
+        self.connectors = {}
+        self.outbox = []
+        self.folder = None
+
+    def assign(self, folders):
+        for folder in set(self.connectors) - set(folders):
+            backend = self.connectors.pop(folder).backend
+            if backend is not None:
+                backend.close()
+        for folder in folders:
+            if folder not in self.connectors:
+                self.connectors[folder] = EmailConnector(self.assistant.config, folder)
+
+    def check_folder(self, folder):
+        """Check one folder; returns its new items as (root, item) pairs"""
+        self.folder = folder
+        self.assistant.connector = self.connectors[folder]
+        self.outbox = []
+        self.check()
+        return self.outbox
+
+    def enqueue(self, root, item, level, queued_at):
+        # Decisions, including auto-unsubscribe, are made by the coordinator
+        item.update(level=level, queued_at=queued_at, folder=self.folder)
+        self.outbox.append((root, item))
+        return True
+
+    def commit(self):
+        # Items not handed over yet: see worker_main, which commits on 'ack'
+        if not self.outbox:
+            super().commit()
+
+    def stats(self):
+        triage = defaultdict(int)
+        for connector in self.connectors.values():
+            for key, value in connector.stats.items():
+                triage[key] += value
+        return {**self.assistant.stats, 'folders': len(self.connectors), 'header_stage': dict(triage)}
+
+
+def worker_main(worker_id, control, results):
+    """Entry point of a worker process"""
+    # Ctrl+C goes to the whole process group; the coordinator stops us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Progress lines from every worker would drown the coordinator's; errors are reported
+    sys.stdout = open(os.devnull, 'w')
+    from email_assistant_cli import EmailAssistantCLI
+
+    assistant = EmailAssistantCLI()
+    assistant.reputation.autosave = False
+    assistant.reputation.take_deltas()
+    assistant.config_watcher.start()
+    worker = ShardWorker(assistant)
+    scheduler = assistant.scheduler
+    folders = []
+    # Folders whose last items the coordinator hasn't acknowledged yet
+    unacked = set()
+    next_poll = 0
+
+    while True:
+        if folders and time.time() >= next_poll:
+            found = 0
+            for folder in folders:
+                if folder in unacked:
+                    continue
+                try:
+                    items = worker.check_folder(folder)
+                except Exception as e:
+                    results.put(('error', worker_id, f"{folder}: {e}"))
+                    continue
+                if items:
+                    results.put(('items', worker_id, folder, items))
+                    unacked.add(folder)
+                    found += len(items)
+            results.put(('stats', worker_id, worker.stats(), assistant.reputation.take_deltas()))
+            scheduler.record(found)
+            next_poll = time.time() + scheduler.next_delay()
+
+        # Wait out the poll interval, or until the coordinator has news
+        try:
+            message = control.get(timeout=max(0, next_poll - time.time()) if folders else None)
+        except queue.Empty:
+            continue
+        if message[0] == 'stop':
+            break
+        if message[0] == 'assign':
+            folders = message[1]
+            worker.assign(folders)
+            unacked &= set(folders)
+            next_poll = 0
+        elif message[0] == 'ack':
+            folder = message[1]
+            if folder in unacked and folder in worker.connectors:
+                worker.connectors[folder].commit()
+            unacked.discard(folder)
+        else:
+            next_poll = 0
+    worker.assign([])
+    assistant.config_watcher.stop()
+
+
+class ShardCoordinator(AssistantDaemon):
+    """Daemon whose mail checks run in worker processes, one approval queue for all"""
+
+    def __init__(self, assistant, workers=None, socket_path=None):
+        super().__init__(assistant, socket_path)
+        self.worker_count = workers or os.cpu_count() or 1
+        # Forking a process that already has threads and SQLite handles is unsafe
+        self.context = multiprocessing.get_context('spawn')
+        self.results = self.context.Queue()
+        self.workers = {}
+        self.worker_stats = {}
+        # Last stats of workers that died, so totals don't go backwards
+        self.retired_stats = []
+        self.ring = HashRing()
+        self.folders = []
+        self.next_id = 0
+        self.restart_at = 0
+        self.connectors = {}
+        self.shard_stats = {'items': 0, 'rebalances': 0, 'worker_deaths': 0, 'errors': 0}
+
+    # Workers
+
+    def spawn(self):
+        worker_id = self.next_id
+        self.next_id += 1
+        control = self.context.Queue()
+        process = self.context.Process(target=worker_main, args=(worker_id, control, self.results),
+                                       name=f'shard-{worker_id}', daemon=True)
+        process.start()
+        self.workers[worker_id] = (process, control)
+        self.ring.add(worker_id)
+
+    def rebalance(self):
+        """Send every worker its folders from the ring"""
+        assignments = defaultdict(list)
+        for folder in self.folders:
+            assignments[self.ring.node_for(folder)].append(folder)
+        for worker_id, (_, control) in self.workers.items():
+            control.put(('assign', assignments.get(worker_id, [])))
+        self.shard_stats['rebalances'] += 1
+
+    def supervise(self):
+        """Replace dead workers: rebalance now, restart after RESTART_DELAY"""
+        changed = False
+        for worker_id, (process, _) in list(self.workers.items()):
+            if not process.is_alive():
+                self.assistant.log(f"Shard worker {worker_id} exited ({process.exitcode}); rebalancing")
+                del self.workers[worker_id]
+                if worker_id in self.worker_stats:
+                    self.retired_stats.append(self.worker_stats.pop(worker_id))
+                self.ring.remove(worker_id)
+                self.shard_stats['worker_deaths'] += 1
+                self.restart_at = time.time() + RESTART_DELAY
+                changed = True
+        if len(self.workers) < self.worker_count and time.time() >= self.restart_at:
+            while len(self.workers) < self.worker_count:
+                self.spawn()
+            changed = True
+        if changed:
+            self.rebalance()
+
+    def receive(self, message):
+        kind, worker_id = message[0], message[1]
+        if kind == 'items':
+            folder, items = message[2], message[3]
+            with self.lock, self.using_folder(folder):
+                for root, item in items:
+                    self.enqueue(root, item, item['level'], item['queued_at'])
+            self.shard_stats['items'] += len(items)
+            # Held in threads.db now, so the worker may move past them
+            if worker_id in self.workers:
+                self.workers[worker_id][1].put(('ack', folder))
+        elif kind == 'stats':
+            self.worker_stats[worker_id] = message[2]
+            self.assistant.reputation.merge(message[3])
+        elif kind == 'error':
+            self.shard_stats['errors'] += 1
+            self.assistant.log(f"Shard worker {worker_id}: {message[2]}")
+
+    @contextlib.contextmanager
+    def using_folder(self, folder):
+        """Point the assistant at a folder's connector while acting on its mail"""
+        if folder is None:
+            yield
+            return
+        if folder not in self.connectors:
+            self.connectors[folder] = EmailConnector(self.assistant.config, folder)
+        connector = self.assistant.connector
+        self.assistant.connector = self.connectors[folder]
+        try:
+            yield
+        finally:
+            self.assistant.connector = connector
+
+    # Pipeline
+
+    def check(self):
+        """Ask every worker to check now; items arrive as they finish"""
+        for _, control in self.workers.values():
+            control.put(('wake',))
+        return 0
+
+    def poll_loop(self):
+        """Run the workers and collect their items until stopped"""
+        try:
+            self.folders = list_folders(self.assistant.config)
+        except Exception as e:
+            self.assistant.log(f"Could not list folders ({e}); sharding INBOX only")
+            self.folders = ['INBOX']
+        self.assistant.log(f"Sharding {len(self.folders)} folder(s) over {self.worker_count} worker(s)")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    # Workers reload the config themselves
+                    self.assistant.reload_config()
+                    self.supervise()
+                    try:
+                        self.receive(self.results.get(timeout=SUPERVISE_SECONDS))
+                    except queue.Empty:
+                        pass
+                except Exception as e:
+                    self.assistant.log(f"Error in shard coordinator: {e}")
+        finally:
+            for process, control in self.workers.values():
+                control.put(('stop',))
+            for process, _ in self.workers.values():
+                process.join(timeout=5)
+
+    # RPC methods
+
+    def summary(self, root, item):
+        summary = super().summary(root, item)
+        summary['folder'] = item.get('folder')
+        return summary
+
+    def rpc_decide(self, item_id, choice):
+        with self.lock:
+            item = self.pending.get(item_id)
+            with self.using_folder(item.get('folder') if item else None):
+                return super().rpc_decide(item_id, choice)
+
+    def rpc_stats(self):
+        stats = super().rpc_stats()
+        header_stage = defaultdict(int)
+        for worker in list(self.worker_stats.values()) + self.retired_stats:
+            stats['checked'] += worker['checked']
+            for key, value in worker['header_stage'].items():
+                header_stage[key] += value
+        stats['header_stage'] = dict(header_stage)
+        stats['shards'] = {
+            **self.shard_stats,
+            'folders': len(self.folders),
+            'workers': {worker_id: {'pid': process.pid, **self.worker_stats.get(worker_id, {})}
+                        for worker_id, (process, _) in self.workers.items()}
+        }
+        return stats
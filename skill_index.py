@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Skill Index - TF-IDF nearest-neighbour matching of requests to skills
+
+Every example a skill has learned is a row in a sparse TF-IDF matrix
+(CSR arrays). Requests are matched by cosine similarity to the nearest
+examples; a per-term posting index keeps each lookup proportional to the
+query's terms rather than the number of skills.
+
+NumPy is optional: without it the same index runs on plain lists.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+
+# NumPy is imported when the first index is built, not at startup
+np = None
+_numpy_checked = False
+
+
+def _load_numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+
+
+TOKEN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be by can could do for from have i in is it me my of on or '
+    'please the this to us we with would you your'.split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [t for t in TOKEN.findall((text or '').lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class SkillIndex:
+    """Incremental TF-IDF index over skill examples"""
+
+    def __init__(self):
+        _load_numpy()
+        self.examples = []
+        self.vocab = {}
+        self.doc_freq = []
+        self.row_skill = []
+        # CSR layout: row i has terms indices[indptr[i]:indptr[i+1]] with counts in data
+        self.indptr = [0]
+        self.indices = []
+        self.data = []
+        # Per-term postings for lookups: term id -> ([rows], [counts])
+        self.postings = []
+        self._posting_arrays = {}
+        self._idf = None
+        self._norms = None
+
+    @classmethod
+    def from_dir(cls, skills_dir):
+        """Build an index from every skill JSON in a directory"""
+        index = cls()
+        for skill_file in sorted(Path(skills_dir).glob('*.json')):
+            try:
+                with open(skill_file) as f:
+                    skill = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for example in skill.get('examples', []):
+                index.add_example(skill['name'], example)
+        return index
+
+    def __len__(self):
+        return len(self.row_skill)
+
+    def add_example(self, skill_name, text):
+        """Add one example row for a skill"""
+        counts = Counter(tokenize(text))
+        if not counts:
+            return
+        row = len(self.row_skill)
+        self.examples.append((skill_name, text))
+        self.row_skill.append(skill_name)
+        for term, count in counts.items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self.vocab[term] = len(self.doc_freq)
+                self.doc_freq.append(0)
+                self.postings.append(([], []))
+            self.doc_freq[term_id] += 1
+            self.indices.append(term_id)
+            self.data.append(count)
+            rows, tfs = self.postings[term_id]
+            rows.append(row)
+            tfs.append(count)
+            self._posting_arrays.pop(term_id, None)
+        self.indptr.append(len(self.indices))
+        # IDF moved for every document, so weights are recomputed on next lookup
+        self._idf = None
+        self._norms = None
+
+    def remove_skill(self, skill_name):
+        """Drop a skill's rows (rebuilds the index from the remaining examples)"""
+        examples = [(name, text) for name, text in self.examples if name != skill_name]
+        self.__init__()
+        for name, text in examples:
+            self.add_example(name, text)
+
+    def idf(self):
+        """Smoothed inverse document frequency of every term"""
+        if self._idf is None:
+            n = len(self.row_skill)
+            if np is not None:
+                self._idf = np.log((n + 1) / (np.asarray(self.doc_freq, dtype=np.float64) + 1)) + 1
+            else:
+                self._idf = [math.log((n + 1) / (df + 1)) + 1 for df in self.doc_freq]
+        return self._idf
+
+    def norms(self):
+        """L2 norm of every row's TF-IDF vector"""
+        if self._norms is not None:
+            return self._norms
+        idf = self.idf()
+        if np is not None:
+            indices = np.asarray(self.indices, dtype=np.int64)
+            weights = (1 + np.log(np.asarray(self.data, dtype=np.float64))) * idf[indices]
+            rows = np.repeat(np.arange(len(self.row_skill)), np.diff(np.asarray(self.indptr)))
+            self._norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(self.row_skill)))
+        else:
+            self._norms = [
+                math.sqrt(sum(
+                    ((1 + math.log(self.data[j])) * idf[self.indices[j]]) ** 2
+                    for j in range(self.indptr[i], self.indptr[i + 1])
+                ))
+                for i in range(len(self.row_skill))
+            ]
+        return self._norms
+
+    def match(self, text, k=3):
+        """Top-k skills for a request as [(skill_name, cosine score)]"""
+        counts = Counter(t for t in tokenize(text) if t in self.vocab)
+        if not counts or not self.row_skill:
+            return []
+        idf = self.idf()
+        norms = self.norms()
+        query = {self.vocab[t]: (1 + math.log(c)) * idf[self.vocab[t]] for t, c in counts.items()}
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+
+        if np is not None:
+            row_parts, weight_parts = [], []
+            for term_id, q_weight in query.items():
+                rows, tfs = self._postings_array(term_id)
+                row_parts.append(rows)
+                weight_parts.append((1 + np.log(tfs)) * (idf[term_id] * q_weight))
+            scores = np.bincount(
+                np.concatenate(row_parts), weights=np.concatenate(weight_parts),
+                minlength=len(self.row_skill)
+            )
+            hit_rows = np.flatnonzero(scores)
+            cosines = scores[hit_rows] / (norms[hit_rows] * query_norm)
+            # Best row per skill, best skills first
+            order = np.argsort(-cosines)
+            ranked = ((self.row_skill[hit_rows[i]], float(cosines[i])) for i in order)
+        else:
+            scores = Counter()
+            for term_id, q_weight in query.items():
+                rows, tfs = self.postings[term_id]
+                for row, tf in zip(rows, tfs):
+                    scores[row] += (1 + math.log(tf)) * idf[term_id] * q_weight
+            ranked = sorted(
+                ((self.row_skill[row], s / (norms[row] * query_norm)) for row, s in scores.items()),
+                key=lambda item: -item[1]
+            )
+
+        results = []
+        seen = set()
+        for name, score in ranked:
+            if name in seen:
+                continue
+            seen.add(name)
+            results.append((name, round(score, 4)))
+            if len(results) >= k:
+                break
+        return results
+
+    def _postings_array(self, term_id):
+        arrays = self._posting_arrays.get(term_id)
+        if arrays is None:
+            rows, tfs = self.postings[term_id]
+            arrays = (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float64))
+            self._posting_arrays[term_id] = arrays
+        return arrays
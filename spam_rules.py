@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Spam Rules - Keyword matcher and whitelist built from the config
+
+Built once per config snapshot instead of per message: the spam words
+become one compiled pattern that finds every word in a single pass over
+the text, and whitelisted domains become a set that a sender's domain and
+its parent domains are looked up in. Rebuilt only when spam_words or
+whitelist_domains change.
+"""
+
+import re
+
+from message_record import parse_sender
+
+
+DEFAULT_SPAM_WORDS = [
+    'unsubscribe', 'promotional', 'marketing', 'limited time', 'act now',
+    'click here', 'buy now', 'order now', 'special offer', 'free gift',
+    'congratulations', 'winner', 'claim now', 'urgent', 'important notice'
+]
+
+
+def whitelist_set(domains):
+    """Lowercased whitelist entries, without a leading '@'"""
+    return frozenset(d.lower().lstrip('@') for d in domains if d)
+
+
+def domain_whitelisted(domain, whitelist):
+    """True if domain, or one of its parent domains, is in whitelist"""
+    labels = domain.split('.') if domain else []
+    return any('.'.join(labels[i:]) in whitelist for i in range(len(labels)))
+
+
+class SpamRules:
+    """Derived lookup structures for is_spam_email"""
+
+    CONFIG_KEYS = frozenset({'spam_words', 'whitelist_domains'})
+
+    def __init__(self, spam_words, whitelist_domains):
+        words = sorted({w.lower() for w in spam_words if w}, key=len, reverse=True)
+        # Lookahead so overlapping words are all found; longest first at each position
+        self.keywords = re.compile('(?=(' + '|'.join(map(re.escape, words)) + '))') if words else None
+        self.whitelist = whitelist_set(whitelist_domains)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('spam_words', DEFAULT_SPAM_WORDS), config.get('whitelist_domains', []))
+
+    def keyword_hits(self, *texts):
+        """Distinct spam words found in any of the (lowercased) texts"""
+        if self.keywords is None:
+            return set()
+        return {word for text in texts for word in self.keywords.findall(text)}
+
+    def whitelisted(self, sender):
+        """True if the sender's domain, or a parent domain, is whitelisted"""
+        return domain_whitelisted(parse_sender(sender)[2], self.whitelist)
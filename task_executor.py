@@ -11,7 +11,8 @@ from pathlib import Path
 class TaskExecutor:
     """Execute tasks using available tools"""
     
-    def __init__(self):
+    def __init__(self, search_index=None):
+        self.search_index = search_index
         self.workspace = Path.home() / '.boss_assistant' / 'workspace'
         self.workspace.mkdir(parents=True, exist_ok=True)
     
@@ -55,11 +56,20 @@ class TaskExecutor:
         }
     
     def do_research(self, task_data):
-        """Do research"""
+        """Do research, starting from related mail already processed"""
+        if self.search_index is None:
+            from search_index import SearchIndex
+            self.search_index = SearchIndex()
+        hits = self.search_index.related(task_data['extracted_request'])
+        
+        output = f"Research completed on: {task_data['extracted_request']}"
+        for hit in hits:
+            output += f"\n  Related: {hit['subject']} ({hit['from']}): {hit['snippet']}"
         return {
             'success': True,
-            'output': f"Research completed on: {task_data['extracted_request']}",
-            'files': ['research_notes.txt']
+            'output': output,
+            'files': ['research_notes.txt'],
+            'related': hits
         }
     
     def create_document(self, task_data):
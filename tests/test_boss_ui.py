@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Boss Assistant UI - batched log updates and capped scrollback
+
+Needs a display; headless, run it under Xvfb:
+
+    xvfb-run python -m pytest tests/test_boss_ui.py
+
+Skipped when tkinter is missing or no display can be opened.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+try:
+    import tkinter as tk
+except ImportError:
+    tk = None
+
+
+@unittest.skipIf(tk is None, "tkinter not installed")
+@unittest.skipUnless(os.environ.get('DISPLAY'), "no display (run under xvfb-run)")
+class BossUiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        home = mock.patch.dict(os.environ, {'HOME': self.tmp.name})
+        home.start()
+        self.addCleanup(home.stop)
+        import boss_assistant_old
+
+        self.module = boss_assistant_old
+        try:
+            self.app = boss_assistant_old.BossAssistant()
+        except tk.TclError as e:
+            self.skipTest(f"no display: {e}")
+        # Start from an empty log, without the startup lines
+        self.drain()
+        self.app.log_text.delete('1.0', tk.END)
+        self.inserts = 0
+        insert = self.app.log_text.insert
+
+        def counting_insert(*args):
+            self.inserts += 1
+            return insert(*args)
+
+        self.app.log_text.insert = counting_insert
+
+    def tearDown(self):
+        self.app.root.destroy()
+        self.tmp.cleanup()
+
+    def drain(self):
+        while not self.app.ui_events.empty():
+            self.app.drain_ui_events()
+
+    def log_lines(self):
+        return self.app.log_text.get('1.0', 'end-1c').splitlines()
+
+    def test_burst_from_worker_thread_is_batched(self):
+        worker = threading.Thread(target=lambda: [self.app.log(f"line {i}") for i in range(1000)])
+        worker.start()
+        worker.join()
+        self.drain()
+        self.assertEqual(self.inserts, -(-1000 // self.module.UI_BATCH))
+        self.assertEqual(len(self.log_lines()), 1000)
+        self.assertTrue(self.log_lines()[-1].endswith("line 999"))
+
+    def test_scrollback_capped(self):
+        for i in range(self.module.MAX_LOG_LINES + 500):
+            self.app.log(f"line {i}")
+        self.drain()
+        lines = self.log_lines()
+        self.assertEqual(len(lines), self.module.MAX_LOG_LINES)
+        self.assertTrue(lines[0].endswith("line 500"))
+
+    def test_widget_updates_keep_their_order(self):
+        seen = []
+        self.app.log("before")
+        self.app.post(lambda: seen.append(self.log_lines()))
+        self.app.log("after")
+        self.drain()
+        self.assertEqual(len(seen[0]), 1)
+        self.assertTrue(seen[0][0].endswith("before"))
+        self.assertEqual(len(self.log_lines()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Graph backend - delta sync and $batch against a local HTTP stand-in
+
+A small http.server plays the Graph API, so no tenant is needed.
+"""
+
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from graph_backend import BATCH_LIMIT, SELECT_FIELDS, GraphBackend
+from rate_limiter import MAX_RETRIES, AccountRateLimiter
+
+
+def message(msg_id, sender, subject, is_read=False):
+    return {
+        'id': msg_id,
+        'subject': subject,
+        'from': {'emailAddress': {'address': sender, 'name': sender.split('@')[0]}},
+        'body': {'contentType': 'text', 'content': f'Body of {subject}'},
+        'isRead': is_read,
+        'receivedDateTime': '2026-10-19T09:00:00Z',
+        'internetMessageId': f'<{msg_id}@example.com>',
+        'conversationId': f'conv-{msg_id}'
+    }
+
+
+class FakeGraph(BaseHTTPRequestHandler):
+    """Inbox delta in two pages, then an empty delta
+
+    $batch answers 200 per request, or 429 for urls in server.throttle
+    (url: times left, with server.retry_after as Retry-After).
+    """
+
+    def do_GET(self):
+        self.server.log.append(('GET', self.path, None))
+        base = self.server.base_url
+        url = urlsplit(self.path)
+        if url.path == '/me/mailFolders/inbox/messages/delta':
+            self.reply({'value': [message('m1', 'boss@onwasa.com', 'Budget')],
+                        '@odata.nextLink': f'{base}/page2'})
+        elif url.path == '/page2':
+            self.reply({'value': [message('m2', 'old@example.com', 'Read already', is_read=True),
+                                  message('m3', 'news@example.com', 'Weekly'),
+                                  {'id': 'm4', '@removed': {'reason': 'deleted'}}],
+                        '@odata.deltaLink': f'{base}/delta?token=1'})
+        elif url.path == '/delta':
+            self.reply({'value': [], '@odata.deltaLink': f'{base}/delta?token=2'})
+        else:
+            self.reply({'error': {'message': 'not found'}}, 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.log.append(('POST', self.path, body))
+        responses = []
+        for r in body['requests']:
+            if self.server.throttle.get(r['url'], 0) > 0:
+                self.server.throttle[r['url']] -= 1
+                responses.append({'id': r['id'], 'status': 429,
+                                  'headers': {'Retry-After': self.server.retry_after}, 'body': {}})
+            else:
+                responses.append({'id': r['id'], 'status': 200, 'body': {}})
+        self.reply({'responses': responses})
+
+    def reply(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GraphBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGraph)
+        self.server.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.server.log = []
+        self.server.throttle = {}
+        self.server.retry_after = '0'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state_path = Path(self.tmp.name) / 'graph_delta.json'
+        self.backend = GraphBackend('token', base_url=self.server.base_url, state_path=self.state_path)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def gets(self):
+        return [path for method, path, _ in self.server.log if method == 'GET']
+
+    def batches(self):
+        return [body['requests'] for method, path, body in self.server.log if path == '/$batch']
+
+    def test_delta_pages_are_followed(self):
+        emails = self.backend.check_unread()
+        self.assertEqual([e['id'] for e in emails], ['m1', 'm3'])
+        self.assertEqual(emails[0]['from'], 'boss@onwasa.com')
+        self.assertEqual(emails[0]['body'], 'Body of Budget')
+        self.assertEqual([urlsplit(p).path for p in self.gets()],
+                         ['/me/mailFolders/inbox/messages/delta', '/page2'])
+
+    def test_first_request_selects_scored_fields(self):
+        self.backend.check_unread()
+        query = parse_qs(urlsplit(self.gets()[0]).query)
+        self.assertEqual(query['$select'], [','.join(SELECT_FIELDS)])
+
+    def test_delta_link_saved_only_on_commit(self):
+        self.backend.check_unread()
+        self.assertFalse(self.state_path.exists())
+        # Not handled: the next poll starts from the same place
+        self.backend.check_unread()
+        self.assertEqual(urlsplit(self.gets()[2]).path, '/me/mailFolders/inbox/messages/delta')
+
+        self.backend.commit()
+        self.assertEqual(json.loads(self.state_path.read_text()),
+                         {'delta_link': f'{self.server.base_url}/delta?token=1'})
+        # A new backend (e.g. after a restart) resumes from the saved link
+        backend = GraphBackend('token', base_url=self.server.base_url, state_path=self.state_path)
+        self.assertEqual(backend.check_unread(), [])
+        self.assertEqual(self.gets()[-1], '/delta?token=1')
+
+    def test_operations_batched_in_twenties(self):
+        ids = [f'm{i}' for i in range(45)]
+        results = self.backend.mark_read(ids)
+        batches = self.batches()
+        self.assertEqual([len(b) for b in batches], [BATCH_LIMIT, BATCH_LIMIT, 5])
+        self.assertEqual([r['url'] for b in batches for r in b], [f'/me/messages/{i}' for i in ids])
+        self.assertTrue(all(r['method'] == 'PATCH' and r['body'] == {'isRead': True} for b in batches for r in b))
+        self.assertEqual(len(results), 45)
+        self.assertEqual(self.backend.pending_ops, [])
+
+    def test_throttled_operations_resent(self):
+        self.server.throttle = {'/me/messages/m3': 1, '/me/messages/m22': 2}
+        results = self.backend.mark_read([f'm{i}' for i in range(25)])
+        self.assertEqual(len(results), 25)
+        self.assertTrue(all(r['status'] == 200 for r in results))
+        sent = [[r['url'] for r in b] for b in self.batches()]
+        # Resent ahead of what was still queued
+        self.assertEqual(sent[1][0], '/me/messages/m3')
+        self.assertEqual(sum(urls.count('/me/messages/m22') for urls in sent), 3)
+
+    def test_throttled_operation_given_up_after_max_retries(self):
+        self.server.throttle = {'/me/messages/m0/move': MAX_RETRIES + 5}
+        results = self.backend.move(['m0', 'm1'], 'junkemail')
+        self.assertEqual(sorted(r['status'] for r in results), [200, 429])
+        self.assertEqual(len(self.batches()), 1 + MAX_RETRIES)
+        self.assertEqual(self.backend.pending_ops, [])
+
+    def test_retry_after_pauses_the_account(self):
+        limiter = AccountRateLimiter()
+        backend = GraphBackend('token', base_url=self.server.base_url, state_path=self.state_path,
+                               limiter=limiter)
+        self.server.throttle = {'/me/messages/m1': 1}
+        self.server.retry_after = '1'
+        started = time.monotonic()
+        results = backend.mark_read(['m1'])
+        self.assertEqual([r['status'] for r in results], [200])
+        self.assertGreaterEqual(time.monotonic() - started, 1.0)
+        self.assertEqual(limiter.metrics['throttle_events'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
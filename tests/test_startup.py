@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Startup budget - importing the CLI must stay cheap
+
+Runs `python -X importtime -c "import email_assistant_cli"` in a fresh
+interpreter and checks that the heavy modules the mail backends need are
+not loaded at startup, and that the whole import stays within budget.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+REPO = Path(__file__).resolve().parent.parent
+# Cumulative import time of email_assistant_cli, in microseconds
+IMPORT_BUDGET_US = 150_000
+# Loaded on first use only
+DEFERRED_MODULES = ('email', 'imaplib', 'ssl', 'numpy', 'mail_backend')
+
+
+def import_times(module):
+    """{module name: cumulative microseconds} from -X importtime"""
+    with tempfile.TemporaryDirectory() as home:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=REPO, env={**os.environ, 'HOME': home},
+                                capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class StartupImportTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The first run may compile bytecode; measure the second
+        import_times('email_assistant_cli')
+        cls.times = import_times('email_assistant_cli')
+
+    def test_heavy_modules_deferred(self):
+        loaded = [name for name in self.times
+                  if any(name == m or name.startswith(m + '.') for m in DEFERRED_MODULES)]
+        self.assertEqual(loaded, [])
+
+    def test_import_budget(self):
+        self.assertLess(self.times['email_assistant_cli'], IMPORT_BUDGET_US)
+
+
+if __name__ == '__main__':
+    unittest.main()
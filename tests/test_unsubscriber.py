@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unsubscriber - one-click POSTs and redirects against a local HTTP stub
+
+A small http.server plays the list senders' unsubscribe endpoints; the
+pool is built with allow_http so it may post to it.
+"""
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from unsubscriber import MAX_REDIRECTS, ONE_CLICK_BODY, Unsubscriber
+
+
+class FakeListServer(BaseHTTPRequestHandler):
+    """/unsub/<list> accepts, /hop/<n> redirects n more times, /away redirects to ftp:,
+    /flaky answers 503 while server.failures lasts"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.log.append(('POST', self.path, body, self.headers['Content-Type']))
+        self.answer()
+
+    def do_GET(self):
+        self.server.log.append(('GET', self.path, None, None))
+        self.answer()
+
+    def answer(self):
+        if self.path.startswith('/hop/') and int(self.path[5:]) > 0:
+            self.redirect(f'/hop/{int(self.path[5:]) - 1}')
+        elif self.path == '/away':
+            self.redirect('ftp://127.0.0.1/unsubscribe')
+        elif self.path == '/flaky' and self.server.failures > 0:
+            self.server.failures -= 1
+            self.reply(503)
+        else:
+            self.reply(200)
+
+    def redirect(self, location):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnsubscriberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeListServer)
+        self.server.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.server.log = []
+        self.server.failures = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.results = []
+        self.unsubscriber = Unsubscriber({'unsubscribed': []}, on_result=self.results.append,
+                                         workers=4, timeout=5, retries=1, allow_http=True)
+
+    def tearDown(self):
+        self.unsubscriber.shutdown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def email(self, path, list_id='', one_click=True):
+        return {
+            'from': 'news@example.com',
+            'list_id': list_id,
+            'list_unsubscribe': f'<mailto:leave@example.com>, <{self.server.base_url}{path}>',
+            'list_unsubscribe_post': 'List-Unsubscribe=One-Click' if one_click else ''
+        }
+
+    def unsubscribe(self, path):
+        return self.unsubscriber.submit(self.email(path)).result(timeout=10)
+
+    def test_one_click_post(self):
+        entry = self.unsubscribe('/unsub/weekly')
+        self.assertEqual((entry['status'], entry['method'], entry['attempts']), ('ok', 'post', 1))
+        self.assertEqual(self.server.log,
+                         [('POST', '/unsub/weekly', ONE_CLICK_BODY, 'application/x-www-form-urlencoded')])
+        self.assertEqual(self.results, [entry])
+
+    def test_http_endpoint_needs_allow_http(self):
+        unsubscriber = Unsubscriber({}, retries=0)
+        try:
+            # Without a mailto: fallback a plain-HTTP link is left to the operator
+            email = self.email('/unsub/weekly')
+            email['list_unsubscribe'] = f'<{self.server.base_url}/unsub/weekly>'
+            entry = unsubscriber.submit(email).result(timeout=10)
+        finally:
+            unsubscriber.shutdown()
+        self.assertEqual(entry['status'], 'manual')
+        self.assertEqual(self.server.log, [])
+
+    def test_same_list_posted_once(self):
+        first = self.unsubscriber.submit(self.email('/unsub/a', list_id='<weekly.example.com>'))
+        self.assertIsNone(self.unsubscriber.submit(self.email('/unsub/b', list_id='<weekly.example.com>')))
+        first.result(timeout=10)
+        self.assertIsNone(self.unsubscriber.submit(self.email('/unsub/c', list_id='<Weekly.example.com>')))
+        self.assertEqual([path for _, path, _, _ in self.server.log], ['/unsub/a'])
+
+    def test_redirect_to_confirmation_followed(self):
+        entry = self.unsubscribe(f'/hop/{MAX_REDIRECTS}')
+        self.assertEqual(entry['status'], 'ok')
+        self.assertEqual(len(self.server.log), 1 + MAX_REDIRECTS)
+
+    def test_redirects_beyond_the_limit_fail(self):
+        entry = self.unsubscribe(f'/hop/{MAX_REDIRECTS + 5}')
+        self.assertEqual((entry['status'], entry['error']), ('failed', 'HTTP 302'))
+        # A redirect is not retried
+        self.assertEqual(entry['attempts'], 1)
+        self.assertEqual(len(self.server.log), 1 + MAX_REDIRECTS)
+
+    def test_redirect_to_other_scheme_not_followed(self):
+        entry = self.unsubscribe('/away')
+        self.assertEqual((entry['status'], entry['error']), ('failed', 'HTTP 302'))
+        self.assertEqual(len(self.server.log), 1)
+
+    def test_server_error_retried(self):
+        self.server.failures = 1
+        entry = self.unsubscribe('/flaky')
+        self.assertEqual((entry['status'], entry['attempts']), ('ok', 2))
+        self.assertEqual([method for method, _, _, _ in self.server.log], ['POST', 'POST'])
+
+
+if __name__ == '__main__':
+    unittest.main()
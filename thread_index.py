@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Thread Index - Groups messages into conversations
+
+Messages are linked through Message-ID, In-Reply-To and References. A
+reply whose references are unknown (or missing) falls back to its
+normalized subject, scoped to the same set of participants, so two
+unrelated mails that happen to share a subject stay apart. Every thread has one pending item
+pointing at its latest message, so a ten-reply thread is classified and
+executed once instead of ten times. Pending items hold keys and ids only;
+the message itself stays with the caller. A message still waiting for a
+decision when a check ends is held here in full, so it survives a restart
+after the backend has moved past it.
+"""
+
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+
+DB_PATH = Path.home() / '.email_assistant' / 'threads.db'
+# Shard workers and the coordinator share the file; a write waits this long for another's
+BUSY_TIMEOUT = 30
+# Subject fallbacks older than this are forgotten
+REPLY_WINDOW = 90 * 86400
+
+REPLY_PREFIX = re.compile(r'^\s*((re|fw|fwd|aw|sv|antw)\s*(\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+
+
+def normalize_subject(subject):
+    """Strip reply/forward prefixes and whitespace noise from a subject"""
+    subject = REPLY_PREFIX.sub('', subject or '')
+    return ' '.join(subject.lower().split())
+
+
+def parse_references(value):
+    """Split a References / In-Reply-To header into message ids"""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [v for v in value if v]
+    return re.findall(r'<[^<>\s]+>', value) or value.split()
+
+
+def participants(email_data):
+    """Sorted addresses of the sender and recipients"""
+    from email.utils import getaddresses
+
+    fields = [email_data.get(key) or '' for key in ('from', 'to', 'cc')]
+    return sorted({address.lower() for _, address in getaddresses(fields) if address})
+
+
+class ThreadIndex:
+    """Durable message → thread root index with one pending item per thread"""
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else DB_PATH
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Callers serialize access (the daemon holds its pipeline lock)
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=BUSY_TIMEOUT)
+        # Readers don't block the writer (or each other) across processes
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS message_thread (
+                message_id TEXT PRIMARY KEY,
+                root_id TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reply_thread (
+                reply_key TEXT PRIMARY KEY,
+                root_id TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pending_thread (
+                root_id TEXT PRIMARY KEY,
+                latest_key TEXT NOT NULL,
+                thread_ids TEXT NOT NULL,
+                message_count INTEGER NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS held (
+                root_id TEXT PRIMARY KEY,
+                email_json TEXT NOT NULL,
+                state_json TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+        ''')
+        self.db.execute('DELETE FROM reply_thread WHERE updated < ?', (time.time() - REPLY_WINDOW,))
+        self.db.commit()
+
+    def thread_root(self, message_id):
+        """Look up the thread root of a message (None if unknown)"""
+        row = self.db.execute(
+            'SELECT root_id FROM message_thread WHERE message_id = ?', (message_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def message_keys(email_data):
+        """(message id, parent ids, subject fallback key or None, is a reply)"""
+        message_id = email_data.get('message_id') or ''
+        parents = parse_references(email_data.get('references'))
+        parents += [p for p in parse_references(email_data.get('in_reply_to')) if p not in parents]
+        subject = email_data.get('subject', '')
+        subject_key = normalize_subject(subject)
+        reply_key = f"{subject_key}\x1f{','.join(participants(email_data))}" if subject_key else None
+        is_reply = bool(parents) or bool(REPLY_PREFIX.match(subject or ''))
+        return message_id, parents, reply_key, is_reply
+
+    def add_message(self, email_data):
+        """Index a message and return the root id of its thread"""
+        message_id, parents, reply_key, is_reply = self.message_keys(email_data)
+
+        root = None
+        for candidate in parents + ([message_id] if message_id else []):
+            root = self.thread_root(candidate)
+            if root:
+                break
+        # Only replies fall back to the subject; a new message starts its own thread
+        if not root and is_reply and reply_key:
+            row = self.db.execute(
+                'SELECT root_id FROM reply_thread WHERE reply_key = ?', (reply_key,)
+            ).fetchone()
+            root = row[0] if row else None
+        if not root:
+            if parents or message_id:
+                root = parents[0] if parents else message_id
+            else:
+                root = f"id:{email_data.get('id', '')}"
+
+        for linked in parents + ([message_id] if message_id else []):
+            self.db.execute(
+                'INSERT OR IGNORE INTO message_thread (message_id, root_id) VALUES (?, ?)',
+                (linked, root)
+            )
+        if reply_key:
+            self.db.execute(
+                'INSERT INTO reply_thread (reply_key, root_id, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(reply_key) DO UPDATE SET updated = excluded.updated',
+                (reply_key, root, time.time())
+            )
+        self.db.commit()
+        return root
+
+    def merge_pending(self, root, email_data):
+        """Make a message the latest of its thread's pending item
+
+        Returns the same message (record or dict) with thread_root,
+        thread_ids and thread_count set; only keys and ids are stored.
+        """
+        existing = self.get_pending(root)
+        ids = existing['thread_ids'] if existing else []
+        if email_data.get('id') and email_data['id'] not in ids:
+            ids.append(email_data['id'])
+
+        count = existing['thread_count'] + 1 if existing else 1
+        latest_key = email_data.get('message_id') or f"id:{email_data.get('id', '')}"
+
+        self.db.execute(
+            'INSERT OR REPLACE INTO pending_thread (root_id, latest_key, thread_ids, message_count, updated) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (root, latest_key, json.dumps(ids), count, time.time())
+        )
+        self.db.commit()
+        email_data['thread_root'] = root
+        email_data['thread_ids'] = ids
+        email_data['thread_count'] = count
+        return email_data
+
+    def get_pending(self, root):
+        """Get the pending item for a thread (None if nothing pending)
+
+        Returned as {thread_root, latest_key, thread_ids, thread_count}.
+        """
+        row = self.db.execute(
+            'SELECT latest_key, thread_ids, message_count FROM pending_thread WHERE root_id = ?', (root,)
+        ).fetchone()
+        if not row:
+            return None
+        return {'thread_root': root, 'latest_key': row[0], 'thread_ids': json.loads(row[1]), 'thread_count': row[2]}
+
+    def list_pending(self):
+        """All pending thread items, oldest first"""
+        rows = self.db.execute(
+            'SELECT root_id FROM pending_thread ORDER BY updated'
+        ).fetchall()
+        return [self.get_pending(row[0]) for row in rows]
+
+    def snapshot(self, email_data):
+        """Rows that decide how a message threads, for seed() to restore elsewhere"""
+        message_id, parents, reply_key, _ = self.message_keys(email_data)
+        ids = parents + ([message_id] if message_id else [])
+        marks = ','.join('?' * len(ids))
+        links = self.db.execute(
+            f'SELECT message_id, root_id FROM message_thread WHERE message_id IN ({marks})', ids
+        ).fetchall() if ids else []
+        replies = self.db.execute(
+            'SELECT reply_key, root_id, updated FROM reply_thread WHERE reply_key = ?', (reply_key,)
+        ).fetchall() if reply_key else []
+        roots = {root for _, root in links} | {root for _, root, _ in replies}
+        marks = ','.join('?' * len(roots))
+        pending = self.db.execute(
+            f'SELECT root_id, latest_key, thread_ids, message_count, updated FROM pending_thread '
+            f'WHERE root_id IN ({marks})', sorted(roots)
+        ).fetchall() if roots else []
+        return {'message_thread': links, 'reply_thread': replies, 'pending_thread': pending}
+
+    def seed(self, snapshot):
+        """Add rows from snapshot() that aren't known here yet"""
+        for table, rows in snapshot.items():
+            if table not in ('message_thread', 'reply_thread', 'pending_thread'):
+                continue
+            for row in rows:
+                self.db.execute(f'INSERT OR IGNORE INTO {table} VALUES ({",".join("?" * len(row))})', row)
+        self.db.commit()
+
+    def hold(self, root, email_data, **state):
+        """Keep the message a thread is waiting on (and small state) until resolved"""
+        fields = {k: v for k, v in email_data.items() if k not in ('fresh_body', 'fresh_offsets')}
+        self.db.execute(
+            'INSERT OR REPLACE INTO held (root_id, email_json, state_json, updated) VALUES (?, ?, ?, ?)',
+            (root, json.dumps(fields, default=str), json.dumps(state), time.time())
+        )
+        self.db.commit()
+
+    def held(self):
+        """(root, email dict, state) of every held message, oldest first"""
+        rows = self.db.execute('SELECT root_id, email_json, state_json FROM held ORDER BY updated').fetchall()
+        return [(root, json.loads(email_json), json.loads(state_json)) for root, email_json, state_json in rows]
+
+    def resolve(self, root):
+        """Remove a thread's pending item (and held message) once it has been handled"""
+        self.db.execute('DELETE FROM pending_thread WHERE root_id = ?', (root,))
+        self.db.execute('DELETE FROM held WHERE root_id = ?', (root,))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
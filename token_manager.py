@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Token Manager - Expiry-aware OAuth token cache
+
+Keeps the cached access token fresh in the background using the refresh
+token, so fetches never wait on sign-in. Concurrent callers share one
+in-flight refresh, and the cache file is always replaced atomically.
+Works with both a plain token dict and an MSAL serialized cache.
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+
+TOKEN_CACHE = Path.home() / '.email_assistant' / 'oauth_token.json'
+DEFAULT_AUTHORITY = 'https://login.microsoftonline.com/common'
+DEFAULT_SCOPE = 'https://graph.microsoft.com/Mail.ReadWrite offline_access'
+REFRESH_MARGIN_SECONDS = 300
+# Floor for the background loop, for tokens issued with less than the margin left
+MIN_REFRESH_SECONDS = 30
+
+
+def _msal_entry(token_data, section):
+    """First entry of an MSAL cache section (AccessToken, RefreshToken)"""
+    entries = token_data.get(section) or {}
+    return next(iter(entries.values()), None)
+
+
+def parse_token(token_data):
+    """Read access token, refresh token and expiry from either cache format"""
+    if 'AccessToken' in token_data or 'RefreshToken' in token_data:
+        access = _msal_entry(token_data, 'AccessToken') or {}
+        refresh = _msal_entry(token_data, 'RefreshToken') or {}
+        return {
+            'access_token': access.get('secret'),
+            'refresh_token': refresh.get('secret'),
+            'expires_on': float(access.get('expires_on') or 0)
+        }
+    expires_on = token_data.get('expires_on')
+    if expires_on is None and token_data.get('expires_in'):
+        expires_on = time.time() + float(token_data['expires_in'])
+    return {
+        'access_token': token_data.get('access_token'),
+        'refresh_token': token_data.get('refresh_token'),
+        'expires_on': float(expires_on or 0)
+    }
+
+
+def apply_refresh(token_data, response):
+    """Merge a token endpoint response back into the cache, keeping its format"""
+    expires_on = str(int(time.time() + float(response.get('expires_in', 3600))))
+    if 'AccessToken' in token_data or 'RefreshToken' in token_data:
+        access = _msal_entry(token_data, 'AccessToken')
+        if access is not None:
+            access['secret'] = response['access_token']
+            access['expires_on'] = expires_on
+            access['cached_at'] = str(int(time.time()))
+        refresh = _msal_entry(token_data, 'RefreshToken')
+        if refresh is not None and response.get('refresh_token'):
+            refresh['secret'] = response['refresh_token']
+        return token_data
+    return {
+        **token_data,
+        'access_token': response['access_token'],
+        'refresh_token': response.get('refresh_token', token_data.get('refresh_token')),
+        'expires_on': expires_on
+    }
+
+
+def refresh_with_endpoint(refresh_token, config):
+    """Redeem a refresh token at the Microsoft identity token endpoint"""
+    client_id = config.get('oauth_client_id')
+    if not client_id:
+        raise ValueError("oauth_client_id is not set - add the app registration's "
+                         "client id to ~/.email_assistant_config.json")
+    authority = config.get('oauth_authority', DEFAULT_AUTHORITY).rstrip('/')
+    data = urllib.parse.urlencode({
+        'client_id': client_id,
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'scope': config.get('oauth_scope', DEFAULT_SCOPE)
+    }).encode()
+    req = urllib.request.Request(f"{authority}/oauth2/v2.0/token", data=data, method='POST')
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+class TokenManager:
+    """Serve access tokens from cache and refresh them before they expire"""
+
+    def __init__(self, config=None, cache_path=None, refresher=None,
+                 margin_seconds=REFRESH_MARGIN_SECONDS):
+        self.config = config or {}
+        self.cache_path = Path(cache_path) if cache_path else TOKEN_CACHE
+        self.refresher = refresher or (lambda refresh_token: refresh_with_endpoint(refresh_token, self.config))
+        self.margin_seconds = margin_seconds
+        self.lock = threading.Lock()
+        self.refresh_done = None
+        self.last_error = None
+        self.token_data = None
+        self.token_mtime = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def load(self):
+        """Load the token cache from disk (None if not signed in)
+
+        Read again whenever the file changes, e.g. after a sign-in or a
+        refresh by another process.
+        """
+        try:
+            mtime = self.cache_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return self.token_data
+        if self.token_data is None or mtime != self.token_mtime:
+            with open(self.cache_path) as f:
+                self.token_data = json.load(f)
+            self.token_mtime = mtime
+        return self.token_data
+
+    def save(self, token_data):
+        """Write the token cache atomically"""
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(f".{self.cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(token_data, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.cache_path)
+        self.token_mtime = self.cache_path.stat().st_mtime_ns
+
+    def seconds_left(self):
+        """Seconds until the cached access token expires"""
+        token_data = self.load()
+        if not token_data:
+            return 0
+        return parse_token(token_data)['expires_on'] - time.time()
+
+    def get_access_token(self, timeout=30):
+        """Return a valid access token.
+
+        A token inside the refresh margin is returned straight away while a
+        refresh runs in the background; only an already expired token waits
+        for the (shared) refresh to finish.
+        """
+        token_data = self.load()
+        if not token_data:
+            return None
+
+        left = self.seconds_left()
+        if left > self.margin_seconds:
+            return parse_token(token_data)['access_token']
+
+        done = self.refresh_async()
+        if left > 0:
+            return parse_token(token_data)['access_token']
+
+        done.wait(timeout)
+        if self.seconds_left() <= 0:
+            return None
+        return parse_token(self.token_data)['access_token']
+
+    def refresh_async(self):
+        """Start a refresh unless one is already in flight; returns its Event"""
+        with self.lock:
+            if self.refresh_done is not None and not self.refresh_done.is_set():
+                return self.refresh_done
+            self.refresh_done = threading.Event()
+            done = self.refresh_done
+        threading.Thread(target=self._refresh, args=(done,), daemon=True).start()
+        return done
+
+    def _refresh(self, done):
+        try:
+            token_data = self.load()
+            refresh_token = parse_token(token_data or {})['refresh_token']
+            if not refresh_token:
+                raise ValueError("no refresh token in cache - sign in again")
+            updated = apply_refresh(token_data, self.refresher(refresh_token))
+            self.save(updated)
+            self.token_data = updated
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+        finally:
+            done.set()
+
+    def start(self):
+        """Refresh proactively in the background until stop() is called"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the background refresher"""
+        self.stop_event.set()
+
+    def _refresh_loop(self):
+        while not self.stop_event.is_set():
+            if not self.load():
+                wait = 60
+            else:
+                wait = self.seconds_left() - self.margin_seconds
+                if wait <= 0:
+                    self.refresh_async().wait(60)
+                    # Back off a little if the refresh failed
+                    wait = 60 if self.last_error else 0
+            self.stop_event.wait(max(wait, MIN_REFRESH_SECONDS))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Unsubscriber - Leaves mailing lists without blocking triage
+
+Parses List-Unsubscribe / List-Unsubscribe-Post headers and unsubscribes
+on a bounded thread pool: an RFC 8058 one-click POST when the sender
+supports it, otherwise a mailto: message over SMTP. Requests are
+deduplicated by list (List-Id, else endpoint), time out, follow only a
+few redirects, and are retried with backoff on network errors and 5xx/429. Every outcome goes to the
+on_result callback, which records it in the 'unsubscribed' config list.
+"""
+
+import re
+import smtplib
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+
+
+ONE_CLICK_BODY = b'List-Unsubscribe=One-Click'
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Redirects followed after a one-click POST (e.g. to a confirmation page)
+MAX_REDIRECTS = 3
+
+
+def parse_list_unsubscribe(value):
+    """URIs from a List-Unsubscribe header, in the sender's order"""
+    return [uri.strip() for uri in re.findall(r'<([^<>]+)>', value or '') if uri.strip()]
+
+
+def list_key(email_data, uri):
+    """What counts as 'the same list' for deduplication"""
+    list_id = re.search(r'<([^<>]+)>', email_data.get('list_id') or '')
+    if list_id:
+        return list_id.group(1).lower()
+    return uri.split('?')[0].lower()
+
+
+class LimitedRedirects(urllib.request.HTTPRedirectHandler):
+    """Follows at most MAX_REDIRECTS redirects, and only to the given schemes"""
+
+    max_redirections = MAX_REDIRECTS
+
+    def __init__(self, schemes):
+        self.schemes = schemes
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not newurl.lower().startswith(self.schemes):
+            raise urllib.error.HTTPError(newurl, code, f"redirect to {newurl} not followed", headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def one_click_post(url, timeout, schemes=('https:',)):
+    """RFC 8058 one-click unsubscribe; returns the HTTP status"""
+    req = urllib.request.Request(url, data=ONE_CLICK_BODY, method='POST')
+    req.add_header('Content-Type', 'application/x-www-form-urlencoded')
+    opener = urllib.request.build_opener(LimitedRedirects(schemes))
+    with opener.open(req, timeout=timeout) as resp:
+        return resp.status
+
+
+def send_mailto(uri, config, timeout):
+    """Send the unsubscribe message a mailto: URI asks for"""
+    parsed = urllib.parse.urlparse(uri)
+    params = urllib.parse.parse_qs(parsed.query)
+    msg = EmailMessage()
+    msg['From'] = config.get('email', '')
+    msg['To'] = urllib.parse.unquote(parsed.path)
+    msg['Subject'] = params.get('subject', ['unsubscribe'])[0]
+    msg.set_content(params.get('body', ['unsubscribe'])[0])
+
+    server = config.get('smtp_server', 'smtp.office365.com')
+    with smtplib.SMTP(server, config.get('smtp_port', 587), timeout=timeout) as smtp:
+        smtp.starttls()
+        smtp.login(config.get('email', ''), config.get('imap_password', ''))
+        smtp.send_message(msg)
+
+
+class Unsubscriber:
+    """Runs unsubscribes on a bounded pool; submit() never blocks"""
+
+    def __init__(self, config, on_result=None, workers=8, timeout=10, retries=2, allow_http=False):
+        self.config = config
+        # RFC 8058 requires HTTPS; plain HTTP is only for local test stubs
+        self.post_schemes = ('https:', 'http:') if allow_http else ('https:',)
+        self.on_result = on_result
+        self.timeout = timeout
+        self.retries = retries
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='unsubscribe')
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.done = {entry['list'] for entry in config.get('unsubscribed', [])
+                     if isinstance(entry, dict) and entry.get('status') == 'ok'}
+
+    def submit(self, email_data):
+        """Queue an unsubscribe for an email's list; returns a Future or None"""
+        uris = parse_list_unsubscribe(email_data.get('list_unsubscribe'))
+        if not uris:
+            return None
+        one_click = 'one-click' in (email_data.get('list_unsubscribe_post') or '').lower()
+        web = [u for u in uris if u.lower().startswith(self.post_schemes)]
+        mailto = [u for u in uris if u.lower().startswith('mailto:')]
+        if web and one_click:
+            method, uri = 'post', web[0]
+        elif mailto:
+            method, uri = 'mailto', mailto[0]
+        else:
+            # Link needs a browser (no one-click support)
+            method, uri = 'manual', uris[0]
+
+        key = list_key(email_data, uri)
+        with self.lock:
+            if key in self.done or key in self.inflight:
+                return None
+            future = self.pool.submit(self._run, key, method, uri, email_data.get('from', ''))
+            self.inflight[key] = future
+        return future
+
+    def _run(self, key, method, uri, sender):
+        entry = {'list': key, 'sender': sender, 'method': method, 'uri': uri,
+                 'date': datetime.now().isoformat()}
+        if method == 'manual':
+            entry['status'] = 'manual'
+        else:
+            entry.update(self._attempt(method, uri))
+        with self.lock:
+            self.inflight.pop(key, None)
+            if entry['status'] == 'ok':
+                self.done.add(key)
+            if self.on_result:
+                self.on_result(entry)
+        return entry
+
+    def _attempt(self, method, uri):
+        """Try an unsubscribe, retrying transient failures with backoff"""
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            try:
+                if method == 'post':
+                    one_click_post(uri, self.timeout, self.post_schemes)
+                else:
+                    send_mailto(uri, self.config, self.timeout)
+                return {'status': 'ok', 'attempts': attempt + 1}
+            except urllib.error.HTTPError as e:
+                error = f"HTTP {e.code}"
+                if e.code not in RETRY_STATUS:
+                    break
+            except (OSError, smtplib.SMTPException) as e:
+                error = str(e) or type(e).__name__
+        return {'status': 'failed', 'error': error, 'attempts': attempt + 1}
+
+    def pending(self):
+        """Number of unsubscribes still running"""
+        with self.lock:
+            return len(self.inflight)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)